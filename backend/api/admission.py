@@ -0,0 +1,126 @@
+# Admission control for the aggregate stats queries. Each request's cost is
+# estimated from its FilterSpec. Cheap requests run straight away; heavy ones
+# need a slot in this worker (a semaphore) and one of the host-wide slots shared
+# by all workers (a flock'd file per slot under ADMISSION_DIR). A heavy request
+# waits up to ADMISSION_QUEUE_TIMEOUT seconds for both, then it is refused with
+# Overloaded (503 with Retry-After) and the caller may answer approximately.
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from werkzeug.exceptions import ServiceUnavailable
+from dimensions import dimensions
+from filters import LOCATION_FIELDS
+
+try:
+    import fcntl
+except ImportError:
+    # No host-wide slots without flock; the per-worker limit still applies
+    fcntl = None
+
+# Cost is in days of unfiltered trips; anything below this is never queued
+ADMISSION_HEAVY_COST = float(os.getenv("ADMISSION_HEAVY_COST", 7))
+ADMISSION_WORKER_SLOTS = int(os.getenv("ADMISSION_WORKER_SLOTS", 1))
+# 0 disables the host-wide limit
+ADMISSION_GLOBAL_SLOTS = int(os.getenv("ADMISSION_GLOBAL_SLOTS", 4))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 5))
+ADMISSION_DIR = os.getenv(
+    "ADMISSION_DIR", os.path.join(tempfile.gettempdir(), "trips-admission"))
+
+# Days assumed for a date range open at one end
+OPEN_RANGE_DAYS = 365
+POLL_INTERVAL = 0.05
+
+
+class Overloaded(ServiceUnavailable):
+    description = "The server is busy with other large queries. Try again shortly."
+
+
+def cost(spec):
+    # Only the date range and the location filters narrow the index range the
+    # scans read; the other filters are checked on every row of it
+    if spec.date_from and spec.date_to:
+        days = max(1, (spec.date_to - spec.date_from).days + 1)
+    else:
+        days = OPEN_RANGE_DAYS
+    fraction = 1.0
+    location_count = max(1, len(dimensions.ensure_loaded().locations))
+    params = spec.params()
+    for name in LOCATION_FIELDS:
+        if name in params:
+            fraction = min(fraction, len(params[name]) / location_count)
+    return days * fraction
+
+
+class HostSlots:
+    # flock'd files are released by the kernel if a worker dies holding one
+    def __init__(self, directory, count):
+        self.directory = directory
+        self.count = count if fcntl is not None else 0
+
+    def _try_acquire(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Start at a different slot per worker so they don't all probe slot 0
+        first = os.getpid() % self.count
+        for i in range(self.count):
+            index = (first + i) % self.count
+            handle = open(os.path.join(self.directory, f"slot-{index}.lock"), "ab")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            return handle
+        return None
+
+    def acquire(self, deadline):
+        # An open file holding a slot, or None once the deadline passes
+        while True:
+            handle = self._try_acquire()
+            if handle is not None or time.monotonic() >= deadline:
+                return handle
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, handle):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+class AdmissionController:
+    def __init__(self, heavy_cost=ADMISSION_HEAVY_COST, worker_slots=ADMISSION_WORKER_SLOTS,
+                 host_slots=ADMISSION_GLOBAL_SLOTS, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                 directory=ADMISSION_DIR):
+        self.heavy_cost = heavy_cost
+        self.queue_timeout = queue_timeout
+        self.worker = threading.BoundedSemaphore(worker_slots)
+        self.host = HostSlots(directory, host_slots)
+
+    def _refuse(self):
+        raise Overloaded(retry_after=ADMISSION_RETRY_AFTER)
+
+    @contextmanager
+    def admit(self, request_cost):
+        if request_cost < self.heavy_cost:
+            yield
+            return
+        deadline = time.monotonic() + self.queue_timeout
+        if not self.worker.acquire(timeout=self.queue_timeout):
+            self._refuse()
+        try:
+            handle = None
+            if self.host.count:
+                handle = self.host.acquire(deadline)
+                if handle is None:
+                    self._refuse()
+            try:
+                yield
+            finally:
+                if handle is not None:
+                    self.host.release(handle)
+        finally:
+            self.worker.release()
+
+
+controller = AdmissionController()
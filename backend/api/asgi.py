@@ -0,0 +1,37 @@
+# Async (ASGI) variant of the API. One event loop serves many dashboards at once
+# and fans the independent queries of a request out concurrently.
+# Run from backend/api:  hypercorn asgi:app --bind 0.0.0.0:3000
+from quart import Quart, request
+from quart_cors import cors
+import os
+import config
+import async_db
+from dimensions import dimensions
+from serialization import FastJSONProvider
+from routes.async_trips import async_trips_bp
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app, request_proxy=request)
+
+# Restrict CORS based on environment
+cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
+app = cors(app, allow_origin=cors_origins)
+
+app.register_blueprint(async_trips_bp, url_prefix="/api")
+
+
+@app.before_serving
+async def startup():
+    # ASYNC_DATABASE_URI allows pointing at a local MySQL stand-in
+    uri = os.getenv("ASYNC_DATABASE_URI", config.database_uri("aiomysql"))
+    async_db.init_engine(uri, **config.engine_options())
+    await async_db.run_sync(dimensions.load)
+
+
+@app.after_serving
+async def shutdown():
+    await async_db.engine.dispose()
+
+
+if __name__ == "__main__":
+    app.run(port=3000)
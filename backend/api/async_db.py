@@ -0,0 +1,36 @@
+# Async engine used by the ASGI app (asgi.py). Every statement checks out its
+# own connection, so independent queries can run at the same time.
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+
+engine = None
+
+
+def init_engine(uri, **options):
+    global engine
+    engine = create_async_engine(uri, **options)
+    return engine
+
+
+async def fetch_all(stmt, params=None):
+    async with engine.connect() as conn:
+        result = await conn.execute(stmt, params)
+        return result.all()
+
+
+async def fetch_first(stmt, params=None):
+    async with engine.connect() as conn:
+        result = await conn.execute(stmt, params)
+        return result.first()
+
+
+async def run_sync_connection(fn):
+    # Runs fn(connection) with a sync facade over an async connection
+    async with engine.connect() as conn:
+        return await conn.run_sync(fn)
+
+
+async def run_sync(fn):
+    # Runs fn(session) with an ORM session bound to an async connection
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: fn(Session(bind=sync_conn)))
@@ -0,0 +1,148 @@
+# Old months tiered out of MySQL into Parquet files by database/tiering.py.
+# When a filter's date range reaches into those months, the trip endpoints
+# query the files with an embedded DuckDB and combine the results with MySQL's.
+#
+# Layout: COLD_DATA_DIR/month=YYYY-MM/trips.parquet (sorted by pickup time)
+
+import os
+import threading
+from datetime import date
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+COLD_DATA_DIR = os.getenv("COLD_DATA_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "cold"))
+
+# Same columns, in the same order, as the trip rows selected from MySQL
+TRIP_COLUMNS = """
+    t.trip_id, t.tpep_pickup_datetime, t.tpep_dropoff_datetime,
+    t.PULocationID, t.DOLocationID, t.trip_distance, t.passenger_count,
+    t.fare_amount, t.tip_amount, t.total_amount
+"""
+
+# Files archived before trips had the derived columns lack them, so cold
+# queries compute them as database/derived.py does
+DURATION = "date_diff('second', t.tpep_pickup_datetime, t.tpep_dropoff_datetime)"
+MPH = f"CASE WHEN {DURATION} > 0 THEN t.trip_distance * 3600 / {DURATION} END"
+TIP_PCT = "100 * t.tip_amount / nullif(t.fare_amount, 0)"
+
+# DuckDB versions of the FilterSpec conditions in queries.py
+CONDITIONS = {
+    'pickup_hour': "hour(t.tpep_pickup_datetime) = ?",
+    'dropoff_hour': "hour(t.tpep_dropoff_datetime) = ?",
+    'date_from': "t.tpep_pickup_datetime >= ?",
+    'date_to': "t.tpep_pickup_datetime <= ?",
+    'min_passengers': "t.passenger_count >= ?",
+    'max_passengers': "t.passenger_count <= ?",
+    'min_distance': "t.trip_distance >= ?",
+    'max_distance': "t.trip_distance <= ?",
+    'min_fare': "t.fare_amount >= ?",
+    'max_fare': "t.fare_amount <= ?",
+    'min_duration': f"{DURATION} >= ?",
+    'max_duration': f"{DURATION} <= ?",
+    # LocationID lists, as resolved by FilterSpec.params
+    'pickup_zone': "list_contains(?, t.PULocationID)",
+    'dropoff_zone': "list_contains(?, t.DOLocationID)",
+    'pickup_borough': "list_contains(?, t.PULocationID)",
+    'dropoff_borough': "list_contains(?, t.DOLocationID)",
+}
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def cold_months():
+    if duckdb is None or not os.path.isdir(COLD_DATA_DIR):
+        return []
+    months = []
+    for name in os.listdir(COLD_DATA_DIR):
+        path = os.path.join(COLD_DATA_DIR, name, "trips.parquet")
+        if name.startswith("month=") and os.path.exists(path):
+            year, month = name[len("month="):].split("-")
+            months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def month_path(month):
+    return os.path.join(COLD_DATA_DIR, f"month={month:%Y-%m}", "trips.parquet")
+
+
+def month_files(spec):
+    # Parquet files of the cold months overlapping the spec's date range
+    first = date(spec.date_from.year, spec.date_from.month, 1) if spec.date_from else None
+    last = spec.date_to
+    return [
+        month_path(month) for month in cold_months()
+        if (first is None or month >= first) and (last is None or month <= last)
+    ]
+
+
+def covers(spec):
+    return bool(month_files(spec))
+
+
+def _cursor():
+    # One in-process database per worker; each call gets its own cursor so
+    # threads can query concurrently
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = duckdb.connect()
+    return _db.cursor()
+
+
+def _query(select_sql, spec, tail="", extra_params=()):
+    files = ", ".join("'" + f.replace("'", "''") + "'" for f in month_files(spec))
+    params = spec.params()
+    sql = (
+        f"SELECT {select_sql} FROM read_parquet([{files}]) t "
+        "WHERE " + " AND ".join(["TRUE"] + [CONDITIONS[name] for name in spec.shape])
+        + " " + tail
+    )
+    cursor = _cursor()
+    cursor.execute(sql, [params[name] for name in spec.shape] + list(extra_params))
+    return cursor
+
+
+def count(spec):
+    return _query("count(*)", spec).fetchone()[0]
+
+
+def totals(spec):
+    # Same columns as queries.trip_totals
+    return _query(f"""
+        count(*),
+        sum(t.fare_amount), count(t.fare_amount),
+        sum(t.trip_distance), count(t.trip_distance),
+        sum({TIP_PCT}), count({TIP_PCT}),
+        sum({DURATION}), count({DURATION}),
+        sum({MPH}), count({MPH})
+    """, spec).fetchone()
+
+
+def zone_counts(spec):
+    return _query("t.PULocationID, count(*)", spec, "GROUP BY 1").fetchall()
+
+
+def hour_counts(spec):
+    return _query("hour(t.tpep_pickup_datetime), count(*)", spec,
+                  "GROUP BY 1").fetchall()
+
+
+def trips_slice(spec, offset, limit):
+    return _query(TRIP_COLUMNS, spec,
+                  "ORDER BY t.tpep_pickup_datetime, t.trip_id LIMIT ? OFFSET ?",
+                  (limit, offset)).fetchall()
+
+
+def export_rows(spec, after, chunk_size):
+    cursor = _query(TRIP_COLUMNS, spec, "AND t.trip_id > ? ORDER BY t.trip_id",
+                    (after,))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
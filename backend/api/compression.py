@@ -0,0 +1,145 @@
+# Response compression with zstd, brotli or gzip, whichever the client's
+# Accept-Encoding allows and is installed (gzip always is). Small bodies
+# are sent as they are, streamed responses are compressed chunk by chunk and
+# flushed so clients still receive each chunk as soon as it is produced, and
+# responses that already carry a Content-Encoding (precompressed bodies) are
+# left alone.
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+
+# Server preference when the client accepts several with the same quality
+ENCODINGS = [name for name, available in (
+    ("zstd", zstandard is not None),
+    ("br", brotli is not None),
+    ("gzip", True),
+) if available]
+
+# On-the-fly levels favour speed; precompressed bodies are encoded once, so
+# they use the slowest, smallest settings
+LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+PRECOMPRESS_LEVELS = {"zstd": 19, "br": 11, "gzip": 9}
+
+COMPRESSIBLE = {
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/vnd.apache.arrow.stream",
+}
+
+
+def negotiate(accept_encodings):
+    # Best encoding from a werkzeug Accept object, or None for identity
+    best, best_quality = None, 0
+    for name in ENCODINGS:
+        quality = accept_encodings[name]
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class _Gzip:
+    def __init__(self, level):
+        self.obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.obj.compress(data) + self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.obj.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self.obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.obj.process(data) + self.obj.flush()
+
+    def finish(self):
+        return self.obj.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self.obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.obj.compress(data) + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.obj.flush()
+
+
+COMPRESSORS = {"gzip": _Gzip, "br": _Brotli, "zstd": _Zstd}
+
+
+def compress(data, encoding, level=None):
+    compressor = COMPRESSORS[encoding](level or LEVELS[encoding])
+    return compressor.compress(data) + compressor.finish()
+
+
+def precompress(data):
+    # Every available encoding of a static body, plus the body itself
+    variants = {None: data}
+    for name in ENCODINGS:
+        variants[name] = compress(data, name, PRECOMPRESS_LEVELS[name])
+    return variants
+
+
+def compress_stream(chunks, encoding, charset="utf-8"):
+    compressor = COMPRESSORS[encoding](LEVELS[encoding])
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+    finally:
+        # Lets the wrapped stream release its cursor if the client goes away
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ""
+    return (mimetype.startswith("text/") or mimetype in COMPRESSIBLE) \
+        and 200 <= response.status_code < 300 and response.status_code != 204 \
+        and "Content-Encoding" not in response.headers \
+        and not response.direct_passthrough
+
+
+def init_app(app):
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < COMPRESS_MIN_SIZE:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,51 @@
+# Database settings shared by the WSGI (main.py) and ASGI (asgi.py) apps
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+
+# Each worker process gets its own pool, so size it for the threads of one worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# Read replicas as host[:port] pairs, comma separated; same user and database
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+# A replica that doesn't answer in time is marked unhealthy instead of stalling reads
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+
+
+def database_uri(driver="pymysql"):
+    return (
+        f"mysql+{driver}://{DB_USER}:{DB_PASSWORD}"
+        f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+
+def replica_uris(driver="pymysql"):
+    uris = []
+    for host in DB_REPLICA_HOSTS:
+        host, _, port = host.partition(":")
+        uris.append(
+            f"mysql+{driver}://{DB_USER}:{DB_PASSWORD}"
+            f"@{host}:{port or DB_PORT}/{DB_NAME}"
+        )
+    return uris
+
+
+def replica_engine_options():
+    return {"connect_args": {"connect_timeout": DB_REPLICA_CONNECT_TIMEOUT}}
+
+
+def engine_options():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
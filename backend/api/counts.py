@@ -0,0 +1,74 @@
+# Total row counts for trip listings. An exact COUNT(*) would double the cost of
+# every page, so totals come from the exact counts the stats queries compute
+# anyway (cached per FilterSpec), falling back to the optimizer's row estimate.
+# Cache keys include the spec's data version, so an ingest into a month only
+# retires the entries for specs covering that month.
+import math
+import os
+from cache import TTLCache
+import cold_storage
+import queries
+
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 300))
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", 3600))
+# How long the last answer for a spec may stand in when the server is overloaded
+STALE_STATS_TTL = int(os.getenv("STALE_STATS_TTL", 86400))
+
+_exact = TTLCache(maxsize=4096, ttl=COUNT_CACHE_TTL)
+_stats = TTLCache(maxsize=1024, ttl=STATS_CACHE_TTL)
+_latest = TTLCache(maxsize=1024, ttl=STALE_STATS_TTL)
+
+
+def remember(spec, version, stats):
+    _stats.set((spec.digest, version), stats)
+    _exact.set((spec.digest, version), stats["total_trips"])
+    _latest.set(spec.digest, stats)
+
+
+def cached_stats(spec, version):
+    return _stats.get((spec.digest, version))
+
+
+def stale_stats(spec):
+    # The newest stats computed for the spec, whatever data version they had
+    return _latest.get(spec.digest)
+
+
+def estimate(connection, spec):
+    # EXPLAIN gives, per joined table, the rows examined per row of the tables
+    # before it and the percentage left after filtering
+    stmt, params = queries.trip_totals(spec)
+    # Values are bound before compiling so IN lists can be expanded into the SQL
+    compiled = stmt.params(params).compile(
+        dialect=connection.dialect,
+        compile_kwargs={"render_postcompile": True}
+    )
+    bound = compiled.params
+    if compiled.positional:
+        bound = tuple(bound[name] for name in compiled.positiontup)
+    plan = connection.exec_driver_sql(
+        "EXPLAIN " + str(compiled), bound).mappings().all()
+
+    total = 1.0
+    for step in plan:
+        if step.get("rows") is None:
+            return None
+        total *= float(step["rows"]) * float(step.get("filtered") or 100) / 100
+    return int(total)
+
+
+def page_totals(connection, spec, version):
+    # Returns (total, approximate)
+    total = _exact.get((spec.digest, version))
+    if total is not None:
+        return total, False
+    total = estimate(connection, spec)
+    if total is not None and cold_storage.covers(spec):
+        total += cold_storage.count(spec)
+    return total, True
+
+
+def total_pages(total):
+    if total is None:
+        return None
+    return max(1, math.ceil(total / queries.PAGE_SIZE))
@@ -0,0 +1,93 @@
+# Data-version watermark. Ingest and maintenance jobs bump the version of every
+# month they change in the data_version table (database/data_version.py); the
+# API derives a version for a FilterSpec from the months its date range covers.
+# That version keys the in-process caches, so a change only invalidates entries
+# for the months it touched, and makes the ETags of the aggregate endpoints.
+import os
+import threading
+import time
+from datetime import date
+from sqlalchemy import select
+from models import DataVersion
+
+# How long the version table is trusted before being read again
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", 2))
+
+_versions = None
+_checked = 0.0
+_lock = threading.Lock()
+_listeners = []
+
+
+def on_change(callback):
+    # callback(months) runs, on the request thread that noticed, whenever a
+    # re-read finds months whose version changed since the previous read
+    _listeners.append(callback)
+
+
+def fresh():
+    # The versions read less than DATA_VERSION_TTL ago, or None
+    with _lock:
+        if _versions is not None and time.monotonic() - _checked < DATA_VERSION_TTL:
+            return _versions
+    return None
+
+
+def current(connection):
+    # {month: version} for every month that was ever bumped
+    global _versions, _checked
+    versions = fresh()
+    if versions is not None:
+        return versions
+    rows = connection.execute(select(DataVersion.month, DataVersion.version)).all()
+    versions = {_month(month): version for month, version in rows}
+    with _lock:
+        previous = _versions
+        _versions, _checked = versions, time.monotonic()
+    if previous is not None and previous != versions:
+        changed = {month for month in versions.keys() | previous.keys()
+                   if versions.get(month) != previous.get(month)}
+        for callback in _listeners:
+            callback(changed)
+    return versions
+
+
+def _month(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return date(value.year, value.month, 1)
+
+
+def version_of(versions, spec):
+    # Versions come from one increasing counter, so the newest month in range
+    # changes whenever any of them does
+    first = _month(spec.date_from) if spec.date_from else None
+    last = _month(spec.date_to) if spec.date_to else None
+    return max((
+        version for month, version in versions.items()
+        if (first is None or month >= first) and (last is None or month <= last)
+    ), default=0)
+
+
+def for_spec(connection, spec):
+    return version_of(current(connection), spec)
+
+
+def etag(kind, spec, version, *extra):
+    return "-".join([kind, str(version), spec.digest] + [str(e) for e in extra])
+
+
+def is_fresh(request, tag):
+    return request.if_none_match.contains_weak(tag)
+
+
+def tag_response(response, tag):
+    # Weak, because the JSON/MessagePack and compressed variants share it.
+    # no-cache lets clients keep the body but revalidate it every time.
+    response.set_etag(tag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(response_class, tag):
+    return tag_response(response_class("", status=304), tag)
@@ -0,0 +1,161 @@
+# Static dimension data (taxi zones, zone GeoJSON and the small lookup tables).
+# It is loaded once per process; under gunicorn with preload_app the master loads
+# it before forking so every worker shares the same pages copy-on-write.
+
+from models import db, Location, Vendors, PaymentType, RateCode, DatasetProfile
+import compression
+import serialization
+
+
+class Dimensions:
+    def __init__(self):
+        self.loaded = False
+        self.locations = {}
+        self.zone_ids = {}
+        self.borough_ids = {}
+        # Lowercased name -> the name as stored
+        self.zone_names = {}
+        self.borough_names = {}
+        self.zones_geojson = b""
+        self.zones_msgpack = None
+        self.zones_encoded = {}
+        self.vendors = {}
+        self.payment_types = {}
+        self.rate_codes = {}
+        # Dataset profile, read on first use and again after a data-version change
+        self.meta = None
+
+    def load(self, session=None):
+        # The async app passes a session bound to one of its own connections
+        session = session or db.session
+        rows = session.query(
+            Location.LocationID,
+            Location.Borough,
+            Location.Zone,
+            Location.service_zone,
+            Location.geometry
+        ).all()
+
+        locations = {}
+        zone_ids = {}
+        borough_ids = {}
+        zone_names = {}
+        borough_names = {}
+        features = []
+        for loc in rows:
+            locations[loc.LocationID] = {
+                "borough": loc.Borough or "Unknown",
+                "zone": loc.Zone or "Unknown",
+                "service_zone": loc.service_zone or "",
+            }
+            # Names are matched case-insensitively, like the MySQL collation did
+            zone_ids.setdefault((loc.Zone or "").lower(), []).append(loc.LocationID)
+            borough_ids.setdefault((loc.Borough or "").lower(), []).append(loc.LocationID)
+            zone_names.setdefault((loc.Zone or "").lower(), loc.Zone or "")
+            borough_names.setdefault((loc.Borough or "").lower(), loc.Borough or "")
+            if not loc.geometry:
+                continue
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "LocationID": loc.LocationID,
+                    "borough": loc.Borough or "Unknown",
+                    "zone": loc.Zone or "Unknown",
+                    "service_zone": loc.service_zone or "",
+                },
+                "geometry": loc.geometry
+            })
+
+        # The GeoJSON never changes between deploys, so keep it pre-encoded (and
+        # precompressed) in every format /zones can answer with
+        geojson = {
+            "type": "FeatureCollection",
+            "features": features
+        }
+        self.zones_geojson = serialization.dumps(geojson)
+        zones_encoded = {serialization.JSON: compression.precompress(self.zones_geojson)}
+        if serialization.msgpack is not None:
+            self.zones_msgpack = serialization.dumps(geojson, serialization.MSGPACK)
+            zones_encoded[serialization.MSGPACK] = compression.precompress(self.zones_msgpack)
+        self.zones_encoded = zones_encoded
+        self.locations = locations
+        self.zone_ids = zone_ids
+        self.borough_ids = borough_ids
+        self.zone_names = zone_names
+        self.borough_names = borough_names
+        self.vendors = dict(session.query(
+            Vendors.VendorID, Vendors.vendor_name).all())
+        self.payment_types = dict(session.query(
+            PaymentType.payment_type, PaymentType.payment_name).all())
+        self.rate_codes = dict(session.query(
+            RateCode.RatecodeID, RateCode.rate_description).all())
+        self.loaded = True
+
+    def location_ids(self, zones=(), boroughs=()):
+        # LocationIDs matching any of the names; a few zone names cover several IDs
+        ids = set()
+        for name in zones:
+            ids.update(self.zone_ids.get(name.lower(), ()))
+        for name in boroughs:
+            ids.update(self.borough_ids.get(name.lower(), ()))
+        return sorted(ids)
+
+    def canonical_name(self, name, borough=False):
+        # The stored spelling of a zone or borough name matched the way
+        # location_ids matches it; names matching nothing are just lowercased
+        names = self.borough_names if borough else self.zone_names
+        return names.get(name.lower(), name.lower())
+
+    def zone_name(self, location_id):
+        location = self.locations.get(location_id)
+        return location["zone"] if location else "Unknown"
+
+    def zones_body(self, mimetype, encoding=None):
+        # Returns (body, mimetype, content encoding or None)
+        if mimetype not in self.zones_encoded:
+            mimetype = serialization.JSON
+        variants = self.zones_encoded[mimetype]
+        if encoding not in variants:
+            encoding = None
+        return variants[encoding], mimetype, encoding
+
+    def load_meta(self, session=None):
+        session = session or db.session
+        row = session.get(DatasetProfile, "trips")
+        profile = row.profile if row is not None else {}
+        values = profile.get("values", {})
+        self.meta = {
+            "rows": profile.get("rows"),
+            "generated_at": profile.get("generated_at"),
+            "columns": profile.get("columns", {}),
+            "zones": [
+                {"id": location_id, "zone": loc["zone"], "borough": loc["borough"]}
+                for location_id, loc in sorted(self.locations.items())
+            ],
+            "boroughs": sorted({loc["borough"] for loc in self.locations.values()}),
+            "vendors": [
+                {"id": vendor_id, "name": name,
+                 "trips": values.get("VendorID", {}).get(str(vendor_id), 0)}
+                for vendor_id, name in sorted(self.vendors.items())
+            ],
+            "payment_types": [
+                {"id": payment_type, "name": name,
+                 "trips": values.get("payment_type", {}).get(str(payment_type), 0)}
+                for payment_type, name in sorted(self.payment_types.items())
+            ],
+        }
+        return self.meta
+
+    def ensure_meta(self):
+        self.ensure_loaded()
+        if self.meta is None:
+            self.load_meta()
+        return self.meta
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+        return self
+
+
+dimensions = Dimensions()
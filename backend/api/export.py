@@ -0,0 +1,171 @@
+# Streaming export of filtered trips. Rows come from a server-side cursor
+# (stream_results uses PyMySQL's SSCursor) and are encoded chunk by chunk, so
+# memory stays flat however many trips match.
+import csv
+import heapq
+import io
+import itertools
+import os
+from models import db
+import cold_storage
+import queries
+import replicas
+import serialization
+import timeouts
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 5000))
+
+
+def _hot_rows(spec, after):
+    stmt, params = queries.trips_export(spec, after)
+    with replicas.read_engine(db).connect() as conn:
+        timeouts.set_budget(conn, timeouts.EXPORT_BUDGET)
+        server_thread_id = timeouts.thread_id(conn)
+        result = conn.execution_options(
+            stream_results=True, max_row_buffer=EXPORT_CHUNK_ROWS
+        ).execute(stmt, params)
+        try:
+            for rows in result.partitions(EXPORT_CHUNK_ROWS):
+                yield from rows
+        except GeneratorExit:
+            # Download aborted: stop the server-side scan rather than let the
+            # unbuffered cursor read the rest of it while closing
+            if server_thread_id is not None:
+                timeouts.kill_query(conn.engine, server_thread_id)
+            raise
+
+
+def stream_rows(spec, after=0):
+    rows = _hot_rows(spec, after)
+    if cold_storage.covers(spec):
+        # Both sources are in trip_id order; merging keeps resume-by-after exact
+        rows = heapq.merge(
+            cold_storage.export_rows(spec, after, EXPORT_CHUNK_ROWS), rows,
+            key=lambda row: row[0])
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK_ROWS))
+        if not chunk:
+            break
+        yield chunk
+
+
+def csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(queries.TRIP_FIELDS)
+    for rows in chunks:
+        writer.writerows(queries.named_trips(rows))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield b"".join(
+            serialization.dumps(queries.trip_to_dict(row)) + b"\n"
+            for row in queries.named_trips(rows)
+        )
+
+
+def columnar_chunks(chunks):
+    # One {"columns", "types", "data"} object per line, each holding a chunk of rows
+    for rows in chunks:
+        yield serialization.dumps(queries.trips_columnar(rows)) + b"\n"
+
+
+def arrow_schema():
+    # Amounts keep the exact DECIMAL(10,2) type of the table
+    money = pa.decimal128(10, 2)
+    return pa.schema([
+        ("no", pa.int64()),
+        ("pickup_time", pa.timestamp("s")),
+        ("dropoff_time", pa.timestamp("s")),
+        ("pickup_zone", pa.string()),
+        ("dropoff_zone", pa.string()),
+        ("distance", money),
+        ("passengers", pa.int32()),
+        ("fare", money),
+        ("tip", money),
+        ("total", money),
+    ])
+
+
+def record_batch(rows, schema):
+    # Builds each column straight from the fetched tuples, no per-row dicts
+    arrays = [
+        pa.array(values, field.type)
+        for values, field in zip(zip(*rows), schema)
+    ]
+    return pa.record_batch(arrays, schema=schema)
+
+
+class ChunkSink:
+    # Write-only file object the Arrow writers encode into; the response drains
+    # it after every batch
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_chunks(chunks, open_writer):
+    schema = arrow_schema()
+    sink = ChunkSink()
+    writer = open_writer(sink, schema)
+    for rows in chunks:
+        writer.write_batch(record_batch(queries.named_trips(rows), schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_chunks(chunks):
+    return _arrow_chunks(chunks, pa.ipc.new_stream)
+
+
+def parquet_chunks(chunks):
+    # One row group per fetched chunk
+    return _arrow_chunks(chunks, lambda sink, schema: pq.ParquetWriter(
+        sink, schema, compression="zstd"))
+
+
+FORMATS = {
+    "csv": (csv_chunks, "text/csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "columnar": (columnar_chunks, "application/x-ndjson"),
+    "arrow": (arrow_chunks, "application/vnd.apache.arrow.stream"),
+    "parquet": (parquet_chunks, "application/vnd.apache.parquet"),
+}
+
+# Formats that need pyarrow
+ARROW_FORMATS = ("arrow", "parquet")
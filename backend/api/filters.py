@@ -0,0 +1,140 @@
+# Trip filters parsed once from the query string into an immutable FilterSpec.
+# A spec has a canonical key/digest, so it can key caches, and a "shape" (the
+# set of filters in use) that selects a prebuilt parameterized statement.
+# Zone and borough filters accept several values (?pickup_zone=A&pickup_zone=B)
+# and are resolved to LocationIDs from the in-memory location dimension.
+
+import hashlib
+from datetime import date, datetime, time
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import abort
+from dimensions import dimensions
+
+DEFAULT_DATE = date(2019, 1, 1)
+
+INT_FIELDS = ('pickup_hour', 'dropoff_hour', 'min_passengers', 'max_passengers')
+FLOAT_FIELDS = ('min_distance', 'max_distance', 'min_fare', 'max_fare',
+                'min_duration', 'max_duration')
+DURATION_FIELDS = ('min_duration', 'max_duration')
+DATE_FIELDS = ('date_from', 'date_to')
+ZONE_FIELDS = ('pickup_zone', 'dropoff_zone')
+BOROUGH_FIELDS = ('pickup_borough', 'dropoff_borough')
+LOCATION_FIELDS = ZONE_FIELDS + BOROUGH_FIELDS
+FIELDS = INT_FIELDS + FLOAT_FIELDS + DATE_FIELDS + LOCATION_FIELDS
+
+
+def _parse_date(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, description=f"Invalid {name} format. Expected YYYY-MM-DD")
+
+
+def _parse_names(args, name):
+    # Canonical names, sorted and deduplicated, so the same selection always
+    # gives the same key whatever its case or order
+    values = [value for value in args.getlist(name)
+              if value and value not in ('All', 'Any')]
+    if not values:
+        return None
+    canonical = dimensions.ensure_loaded().canonical_name
+    return tuple(sorted({canonical(value, borough=name in BOROUGH_FIELDS)
+                         for value in values}))
+
+
+class FilterSpec:
+    __slots__ = FIELDS + ('key', 'digest', '_hash')
+
+    def __init__(self, **values):
+        for name in FIELDS:
+            object.__setattr__(self, name, values.get(name))
+        key = tuple(
+            (name, getattr(self, name)) for name in FIELDS
+            if getattr(self, name) is not None
+        )
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, 'digest', hashlib.sha1(
+            repr(key).encode('utf-8')).hexdigest()[:16])
+        object.__setattr__(self, '_hash', hash(key))
+
+    @classmethod
+    def from_args(cls, args):
+        values = {}
+        for name in INT_FIELDS:
+            values[name] = args.get(name, type=int)
+        for name in FLOAT_FIELDS:
+            values[name] = args.get(name, type=float)
+        for name in DATE_FIELDS:
+            values[name] = _parse_date(args, name)
+        for name in LOCATION_FIELDS:
+            values[name] = _parse_names(args, name)
+
+        if values['date_from'] is None and values['date_to'] is None:
+            values['date_from'] = DEFAULT_DATE
+            values['date_to'] = DEFAULT_DATE
+
+        return cls(**values)
+
+    @classmethod
+    def from_lists(cls, args):
+        # Inverse of to_args
+        return cls.from_args(MultiDict(
+            [(name, value) for name, values in args.items() for value in values]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FilterSpec is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("FilterSpec is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, FilterSpec) and self.key == other.key
+
+    def __repr__(self):
+        return f"FilterSpec({', '.join(f'{k}={v!r}' for k, v in self.key)})"
+
+    def to_args(self):
+        # {name: [values]} that from_args parses back into an equal spec
+        args = {}
+        for name, value in self.key:
+            values = value if isinstance(value, tuple) else (value,)
+            args[name] = [v.isoformat() if isinstance(v, date) else str(v) for v in values]
+        return args
+
+    @property
+    def shape(self):
+        # Which filters are in use; specs of the same shape share a statement
+        return tuple(name for name, _ in self.key)
+
+    def params(self):
+        # Bind parameter values for the statements built from this spec's shape
+        params = dict(self.key)
+        if self.date_from is not None:
+            params['date_from'] = datetime.combine(self.date_from, time.min)
+        if self.date_to is not None:
+            # Set to end of day to include all trips on date_to
+            params['date_to'] = datetime.combine(self.date_to, time(23, 59, 59))
+        # Durations are given in minutes and stored in seconds
+        for name in DURATION_FIELDS:
+            if name in params:
+                params[name] = params[name] * 60
+        for name in ZONE_FIELDS:
+            if name in params:
+                params[name] = dimensions.ensure_loaded().location_ids(zones=params[name])
+        for name in BOROUGH_FIELDS:
+            if name in params:
+                params[name] = dimensions.ensure_loaded().location_ids(boroughs=params[name])
+        return params
+
+    @property
+    def single_pickup_zone(self):
+        # The stats skip the busiest-zone query when only one zone can match
+        if self.pickup_zone and len(self.pickup_zone) == 1:
+            return self.pickup_zone[0]
+        return None
@@ -0,0 +1,35 @@
+# Gunicorn settings for serving the API in production.
+# Run from backend/api:  gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:3000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+keepalive = 5
+
+# Load the app (and its dimension data) once in the master before forking
+preload_app = True
+
+# Keep the pool per worker in line with the threads serving requests
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes, start with an empty pool
+    from db import db
+    from wsgi import app
+
+    with app.app_context():
+        # Replica binds included
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Each worker has its own caches to fill
+    from warmup import warmer
+    warmer.start(app)
@@ -1,35 +1,60 @@
 # Main file to run flask app, ans starts the server on post
 from flask import Flask
 from db import db
-from dotenv import load_dotenv
 import os
+import config
 from routes.auth import auth_bp
 from routes.trips import trips_bp
+from routes.meta import meta_bp
+from dimensions import dimensions
+from serialization import FastJSONProvider
+import compression
+import replicas
+import timeouts
+import warmup
 from flask_cors import CORS
 
-load_dotenv()
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
 
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}"
-    f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+def create_app(preload=False):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config["SQLALCHEMY_DATABASE_URI"] = config.database_uri()
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = config.engine_options()
 
-# Restrict CORS based on environment
-cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
-CORS(app, resources={r"/api/*": {"origins": cors_origins}})
+    # Restrict CORS based on environment
+    cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
+    CORS(app, resources={r"/api/*": {"origins": cors_origins}})
 
-db.init_app(app)
+    # gzip/brotli/zstd for every compressible response, negotiated per request
+    compression.init_app(app)
+    # 504/503 for queries over their time budget, cancelled or without a connection
+    timeouts.init_app(app)
+
+    # Read-only routes go to the replicas when any are configured
+    replica_uris = config.replica_uris()
+    if replica_uris:
+        replicas.configure(app, replica_uris, **config.replica_engine_options())
+    db.init_app(app)
+
+    app.register_blueprint(auth_bp, url_prefix="/api")
+    app.register_blueprint(trips_bp, url_prefix="/api")
+    app.register_blueprint(meta_bp, url_prefix="/api")
+
+    if preload:
+        with app.app_context():
+            dimensions.load()
+            # Don't hand the connection used for preloading down to forked workers
+            db.session.remove()
+            db.engine.dispose()
+
+    return app
 
-app.register_blueprint(auth_bp, url_prefix="/api")
-app.register_blueprint(trips_bp, url_prefix="/api")
 
 if __name__ == "__main__":
+    app = create_app()
     debug_mode = os.getenv("FLASK_ENV") == "development"
+    # With the reloader, only the child process serves requests
+    if not debug_mode or os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        warmup.warmer.start(app)
     app.run(debug=debug_mode, port=3000)
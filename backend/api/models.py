@@ -53,6 +53,10 @@ class Trip(db.Model):
     improvement_surcharge = db.Column(db.Numeric(10, 2))
     total_amount = db.Column(db.Numeric(10, 2))
     congestion_surcharge = db.Column(db.Numeric(10, 2))
+    # Derived at ingest (database/derived.py)
+    duration_seconds = db.Column(db.Integer)
+    mph = db.Column(db.Float)
+    tip_pct = db.Column(db.Float)
 
     pickup_loc = db.relationship('Location', foreign_keys=[
                                   PULocationID], backref='trips_starting_here')
@@ -60,3 +64,19 @@ class Trip(db.Model):
                                   DOLocationID], backref='trips_ending_here')
     vendor_ref = db.relationship('Vendors', foreign_keys=[
         VendorID], backref='trips')
+
+
+class DataVersion(db.Model):
+    # Bumped per month by ingest and maintenance jobs (database/data_version.py)
+    __tablename__ = 'data_version'
+    month = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime)
+
+
+class DatasetProfile(db.Model):
+    # Built by ingest (database/dataset_profile.py), served at /api/meta
+    __tablename__ = 'dataset_profile'
+    name = db.Column(db.String(50), primary_key=True)
+    profile = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime)
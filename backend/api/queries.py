@@ -0,0 +1,296 @@
+# SQL statements behind the trip endpoints. They are plain SQLAlchemy selects so
+# the same statements run on the Flask session (routes/trips.py) and on the
+# async engine (routes/async_trips.py). Each helper returns (statement, params)
+# for a FilterSpec.
+#
+# Every statement reads trips alone: zone and borough filters arrive as
+# LocationID lists (see FilterSpec.params) and zone names are attached to the
+# results from the in-memory location dimension.
+
+from collections import namedtuple
+from models import Trip
+from dimensions import dimensions
+from sqlalchemy import select, extract, bindparam
+from sqlalchemy.sql import func
+
+PAGE_SIZE = 15
+
+
+# Condition used for each filter, written against bind parameters named after
+# the FilterSpec field so one statement serves every spec of the same shape
+CONDITIONS = {
+    'pickup_hour': lambda: extract('hour', Trip.tpep_pickup_datetime) == bindparam('pickup_hour'),
+    'dropoff_hour': lambda: extract('hour', Trip.tpep_dropoff_datetime) == bindparam('dropoff_hour'),
+    'date_from': lambda: Trip.tpep_pickup_datetime >= bindparam('date_from'),
+    'date_to': lambda: Trip.tpep_pickup_datetime <= bindparam('date_to'),
+    'min_passengers': lambda: Trip.passenger_count >= bindparam('min_passengers'),
+    'max_passengers': lambda: Trip.passenger_count <= bindparam('max_passengers'),
+    'min_distance': lambda: Trip.trip_distance >= bindparam('min_distance'),
+    'max_distance': lambda: Trip.trip_distance <= bindparam('max_distance'),
+    'min_fare': lambda: Trip.fare_amount >= bindparam('min_fare'),
+    'max_fare': lambda: Trip.fare_amount <= bindparam('max_fare'),
+    'min_duration': lambda: Trip.duration_seconds >= bindparam('min_duration'),
+    'max_duration': lambda: Trip.duration_seconds <= bindparam('max_duration'),
+    'pickup_zone': lambda: Trip.PULocationID.in_(bindparam('pickup_zone', expanding=True)),
+    'dropoff_zone': lambda: Trip.DOLocationID.in_(bindparam('dropoff_zone', expanding=True)),
+    'pickup_borough': lambda: Trip.PULocationID.in_(bindparam('pickup_borough', expanding=True)),
+    'dropoff_borough': lambda: Trip.DOLocationID.in_(bindparam('dropoff_borough', expanding=True)),
+}
+
+_statements = {}
+
+
+def filtered(stmt, shape):
+    return stmt.select_from(Trip).where(*[CONDITIONS[name]() for name in shape])
+
+
+def statement(kind, spec):
+    # Statements are built once per (kind, shape); SQLAlchemy then reuses the
+    # compiled form too, so a request only supplies parameter values
+    cache_key = (kind, spec.shape)
+    stmt = _statements.get(cache_key)
+    if stmt is None:
+        stmt = _statements[cache_key] = BUILDERS[kind](spec.shape)
+    return stmt
+
+
+def _trip_rows():
+    return select(
+        Trip.trip_id,
+        Trip.tpep_pickup_datetime,
+        Trip.tpep_dropoff_datetime,
+        Trip.PULocationID,
+        Trip.DOLocationID,
+        Trip.trip_distance,
+        Trip.passenger_count,
+        Trip.fare_amount,
+        Trip.tip_amount,
+        Trip.total_amount,
+    )
+
+
+def _trips_page(shape):
+    stmt = filtered(_trip_rows(), shape)
+    return stmt.limit(bindparam('limit')).offset(bindparam('offset'))
+
+
+def _trips_export(shape):
+    # Keyset order on the primary key, so an export can resume after any trip_id
+    stmt = filtered(_trip_rows(), shape)
+    return stmt.where(Trip.trip_id > bindparam('after')).order_by(Trip.trip_id)
+
+
+def _trip_totals(shape):
+    # Sums and counts rather than averages, so partial results (e.g. from cold
+    # storage) can be added together. Tip percentage, duration and speed are
+    # stored at ingest, so none of them is computed per row here.
+    return filtered(select(
+        func.count(),
+        func.sum(Trip.fare_amount),
+        func.count(Trip.fare_amount),
+        func.sum(Trip.trip_distance),
+        func.count(Trip.trip_distance),
+        func.sum(Trip.tip_pct),
+        func.count(Trip.tip_pct),
+        func.sum(Trip.duration_seconds),
+        func.count(Trip.duration_seconds),
+        func.sum(Trip.mph),
+        func.count(Trip.mph),
+    ), shape)
+
+
+def _zone_counts(shape):
+    # Grouped by LocationID; top_zone() turns the IDs into zone names
+    stmt = filtered(select(Trip.PULocationID, func.count()), shape)
+    return stmt.group_by(Trip.PULocationID)
+
+
+def _hour_counts(shape):
+    hour = extract('hour', Trip.tpep_pickup_datetime)
+    stmt = filtered(select(hour, func.count()), shape)
+    return stmt.group_by(hour).order_by(func.count().desc())
+
+
+def _peak_hour(shape):
+    return _hour_counts(shape).limit(1)
+
+
+BUILDERS = {
+    'trips_page': _trips_page,
+    'trips_export': _trips_export,
+    'trip_totals': _trip_totals,
+    'zone_counts': _zone_counts,
+    'hour_counts': _hour_counts,
+    'peak_hour': _peak_hour,
+}
+
+
+def trips_slice(spec, offset, limit=PAGE_SIZE):
+    params = spec.params()
+    params['limit'] = limit
+    params['offset'] = offset
+    return statement('trips_page', spec), params
+
+
+def trips_page(spec, page):
+    return trips_slice(spec, (page - 1) * PAGE_SIZE)
+
+
+def trips_export(spec, after=0):
+    params = spec.params()
+    params['after'] = after
+    return statement('trips_export', spec), params
+
+
+def trip_totals(spec):
+    return statement('trip_totals', spec), spec.params()
+
+
+def zone_counts(spec):
+    return statement('zone_counts', spec), spec.params()
+
+
+def hour_counts(spec):
+    return statement('hour_counts', spec), spec.params()
+
+
+def peak_hour(spec):
+    return statement('peak_hour', spec), spec.params()
+
+
+# Output names of the trip row columns, in select order
+TRIP_FIELDS = ('no', 'pickup_time', 'dropoff_time', 'pickup_zone', 'dropoff_zone',
+               'distance', 'passengers', 'fare', 'tip', 'total')
+
+# A selected trip row with its LocationIDs replaced by zone names
+TripRow = namedtuple('TripRow', [
+    'trip_id', 'tpep_pickup_datetime', 'tpep_dropoff_datetime',
+    'pickup_zone', 'dropoff_zone', 'trip_distance', 'passenger_count',
+    'fare_amount', 'tip_amount', 'total_amount',
+])
+
+
+# Value type of each output column in the columnar format
+TRIP_TYPES = ('int', 'datetime', 'datetime', 'string', 'string',
+              'float', 'int', 'float', 'float', 'float')
+
+# Response shapes of trip lists: a dict per trip, or one array per column
+LIST_FORMATS = ('rows', 'columnar')
+
+
+def _amount(value):
+    return float(value or 0)
+
+
+def _count(value):
+    # Passenger counts can be NULL in old rows; kept as None like trip_to_dict
+    return None if value is None else int(value)
+
+
+def named_trips(rows):
+    zone_name = dimensions.ensure_loaded().zone_name
+    return [
+        TripRow(row[0], row[1], row[2], zone_name(row[3]), zone_name(row[4]), *row[5:])
+        for row in rows
+    ]
+
+
+def trip_to_dict(row):
+    return {
+        "no":           row.trip_id,
+        "pickup_time":  str(row.tpep_pickup_datetime),
+        "dropoff_time": str(row.tpep_dropoff_datetime),
+        "pickup_zone":  row.pickup_zone,
+        "dropoff_zone": row.dropoff_zone,
+        "distance":     float(row.trip_distance or 0),
+        "passengers":   row.passenger_count,
+        "fare":         float(row.fare_amount or 0),
+        "tip":          float(row.tip_amount or 0),
+        "total":        float(row.total_amount or 0),
+    }
+
+
+def trips_columnar(rows):
+    # Built column by column straight from the selected rows, no per-row dicts;
+    # same values as trip_to_dict
+    zone_name = dimensions.ensure_loaded().zone_name
+    converters = (int, str, str, zone_name, zone_name,
+                  _amount, _count, _amount, _amount, _amount)
+    columns = zip(*rows) if rows else [()] * len(TRIP_FIELDS)
+    return {
+        "columns": list(TRIP_FIELDS),
+        "types": dict(zip(TRIP_FIELDS, TRIP_TYPES)),
+        "data": {
+            name: list(map(convert, values))
+            for name, convert, values in zip(TRIP_FIELDS, converters, columns)
+        },
+    }
+
+
+def format_trips(rows, fmt='rows'):
+    if fmt == 'columnar':
+        return trips_columnar(rows)
+    return [trip_to_dict(row) for row in named_trips(rows)]
+
+
+def _add(x, y):
+    x, y = x or 0, y or 0
+    # MySQL sums DECIMAL columns to Decimal, DuckDB may return floats
+    if isinstance(x, float) or isinstance(y, float):
+        return float(x) + float(y)
+    return x + y
+
+
+def merge_totals(a, b):
+    return tuple(_add(x, y) for x, y in zip(a, b))
+
+
+def top_count(*groups):
+    # Merges (key, count) rows from several sources and returns the top row
+    merged = {}
+    for rows in groups:
+        for key, count in rows:
+            merged[key] = merged.get(key, 0) + count
+    if not merged:
+        return None
+    return max(merged.items(), key=lambda item: item[1])
+
+
+def top_zone(*groups):
+    # (LocationID, count) rows to the busiest zone name; zones sharing a name add up
+    zone_name = dimensions.ensure_loaded().zone_name
+    return top_count(*[
+        [(zone_name(location_id), count) for location_id, count in rows]
+        for rows in groups
+    ])
+
+
+def _average(total, count):
+    return float(total) / count if count else 0.0
+
+
+def format_stats(totals, zone_row, hour_row, pickup_zone=None):
+    total_trips = totals[0] or 0
+
+    best = pickup_zone
+    if not best:
+        best = zone_row[0] if (total_trips > 0 and zone_row) else "N/A"
+
+    peak = "N/A"
+    if total_trips > 0 and hour_row:
+        h = int(hour_row[0])
+        suffix = 'AM' if h < 12 else 'PM'
+        display_h = h % 12 or 12
+        peak = f"{display_h}:00 {suffix}"
+
+    return {
+        "total_trips":  total_trips,
+        "avg_fare":     round(_average(totals[1], totals[2]), 2),
+        "avg_distance": round(_average(totals[3], totals[4]), 1),
+        "avg_tip_pct":  round(_average(totals[5], totals[6]), 1),
+        # Minutes and miles per hour
+        "avg_duration": round(_average(totals[7], totals[8]) / 60, 1),
+        "avg_speed":    round(_average(totals[9], totals[10]), 1),
+        "best_zone":    best,
+        "peak_hour":    peak,
+    }
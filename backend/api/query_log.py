@@ -0,0 +1,87 @@
+# Log of the filters each trip request used, one JSON object per line:
+#   {"ts": 1718000000.0, "endpoint": "trips.get_trips_stats", "status": 200,
+#    "ms": 12.5, "filters": {"date_from": ["2019-01-01"], ...}}
+# Every worker appends to the same file; a line is written with a single
+# O_APPEND write, so lines from different workers never interleave. Cache
+# warming reads it for the filters users ask for most. Set QUERY_LOG to an
+# empty string to turn it off.
+import json
+import os
+import time
+from flask import g, request
+from filters import FilterSpec
+import serialization
+
+QUERY_LOG = os.getenv("QUERY_LOG", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "query_log.ndjson"))
+# The log is moved to QUERY_LOG + ".1" (replacing the previous one) past this size
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", 64 * 1024 * 1024))
+# Readers only look at the end of the log
+TAIL_BYTES = 8 * 1024 * 1024
+
+
+def record(endpoint, spec, status, elapsed_ms, path=QUERY_LOG):
+    if not path:
+        return
+    line = serialization.dumps({
+        "ts": round(time.time(), 3),
+        "endpoint": endpoint,
+        "status": status,
+        "ms": round(elapsed_ms, 1),
+        "filters": spec.to_args(),
+    }) + b"\n"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > QUERY_LOG_MAX_BYTES:
+            os.replace(path, path + ".1")
+    except OSError:
+        # Never fail a request over its log line
+        pass
+
+
+def read(since=None, path=QUERY_LOG):
+    # Entries from the end of the log, oldest first, optionally only those
+    # logged at or after the `since` timestamp
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            start = max(0, f.tell() - TAIL_BYTES)
+            f.seek(start)
+            if start:
+                # Skip the line the seek landed in
+                f.readline()
+            lines = f.readlines()
+    except OSError:
+        return
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if since is None or entry["ts"] >= since:
+            yield entry
+
+
+def spec_of(entry):
+    return FilterSpec.from_lists(entry["filters"])
+
+
+def init_blueprint(blueprint):
+    # Routes opt in by putting the spec they parsed in g.filter_spec
+    @blueprint.before_request
+    def start_timer():
+        g.query_started = time.perf_counter()
+
+    @blueprint.after_request
+    def log_query(response):
+        spec = g.get("filter_spec")
+        if spec is not None:
+            elapsed_ms = (time.perf_counter() - g.query_started) * 1000
+            record(request.endpoint, spec, response.status_code, elapsed_ms)
+        return response
@@ -0,0 +1,182 @@
+# Read replica routing. Replicas are extra Flask-SQLAlchemy binds
+# ("replica_0", "replica_1", ...) built from DB_REPLICA_HOSTS; sessions of
+# read-only blueprints (see use_replica) pick one replica on their first query
+# and stay on it for the rest of the request, everything else uses the primary.
+#
+# A background thread in each worker checks every replica each
+# REPLICA_CHECK_INTERVAL seconds, so requests never wait on a check: a replica
+# that fails the check, lags the primary by more than REPLICA_MAX_LAG seconds,
+# or whose lag can't be read, is skipped until a later check passes. Until the
+# first check, and whenever no replica is usable, reads go to the primary.
+import itertools
+import logging
+import os
+import threading
+import time
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc, text
+import timeouts
+
+REPLICA_ROUTING = os.getenv("REPLICA_ROUTING", "round_robin")
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 30))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+
+# Weight of the newest sample in the smoothed latency
+LATENCY_SMOOTHING = 0.3
+
+# MySQL error codes. SHOW REPLICA STATUS is a syntax error before 8.0.22;
+# without the REPLICATION CLIENT privilege, or on a proxy that doesn't know
+# the statement, the lag can't be read at all.
+PARSE_ERROR = 1064
+LAG_UNAVAILABLE = {1044, 1047, 1142, 1227}
+
+logger = logging.getLogger(__name__)
+
+
+class LagUnknown(Exception):
+    pass
+
+
+def bind_key(index):
+    return f"replica_{index}"
+
+
+def _replica_status(connection, statement):
+    try:
+        return connection.exec_driver_sql(statement).mappings().first()
+    except exc.DBAPIError as error:
+        if timeouts.error_code(error) in LAG_UNAVAILABLE:
+            raise LagUnknown(str(error.orig)) from error
+        raise
+
+
+def replication_lag(connection):
+    # Seconds behind the source; 0 for a server that isn't replicating (e.g. a
+    # second standalone instance in development), None if replication is
+    # broken. Raises LagUnknown when the server won't report it.
+    try:
+        row = _replica_status(connection, "SHOW REPLICA STATUS")
+        column = "Seconds_Behind_Source"
+    except exc.DBAPIError as error:
+        if timeouts.error_code(error) != PARSE_ERROR:
+            raise
+        # MySQL before 8.0.22
+        row = _replica_status(connection, "SHOW SLAVE STATUS")
+        column = "Seconds_Behind_Master"
+    if row is None:
+        return 0
+    return row[column]
+
+
+class Replica:
+    def __init__(self, key):
+        self.key = key
+        self.healthy = False
+        self.lag = None
+        self.latency = None
+        self.checked_at = None
+        # Why the lag can't be read, once warned about
+        self.lag_error = None
+
+
+class ReplicaSet:
+    def __init__(self, keys, routing=REPLICA_ROUTING, max_lag=REPLICA_MAX_LAG,
+                 interval=REPLICA_CHECK_INTERVAL):
+        if routing not in ("round_robin", "least_latency"):
+            raise ValueError(f"Unknown REPLICA_ROUTING {routing!r}")
+        self.replicas = [Replica(key) for key in keys]
+        self.routing = routing
+        self.max_lag = max_lag
+        self.interval = interval
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self, replica, engine):
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                latency = time.perf_counter() - start
+                try:
+                    lag = replication_lag(conn)
+                except LagUnknown as error:
+                    # Reachable, but not known to be within max_lag
+                    if replica.lag_error != str(error):
+                        logger.warning("Replica %s: can't read its replication lag, "
+                                       "not reading from it: %s", replica.key, error)
+                    replica.lag_error = str(error)
+                    lag = None
+                else:
+                    replica.lag_error = None
+        except Exception:
+            replica.healthy = False
+            replica.lag = None
+        else:
+            replica.lag = lag
+            replica.healthy = lag is not None and lag <= self.max_lag
+            replica.latency = latency if replica.latency is None else (
+                LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * replica.latency)
+        replica.checked_at = time.monotonic()
+
+    def _refresh(self, engines):
+        while True:
+            for replica in self.replicas:
+                self.check(replica, engines[replica.key])
+            time.sleep(self.interval)
+
+    def _ensure_refreshing(self, engines):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily, so each forked worker gets its own
+                self._thread = threading.Thread(target=self._refresh, args=(engines,),
+                                                daemon=True, name="replica-health")
+                self._thread.start()
+
+    def pick(self, engines):
+        # Bind key of the replica to read from, or None for the primary
+        if not self.replicas:
+            return None
+        self._ensure_refreshing(engines)
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        if self.routing == "least_latency":
+            return min(healthy, key=lambda r: r.latency).key
+        return healthy[next(self._turn) % len(healthy)].key
+
+
+replica_set = ReplicaSet([])
+
+
+class RoutingSession(Session):
+    # Sends a read-only session's statements to the replica chosen for it
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("read_only"):
+            if "replica" not in self.info:
+                self.info["replica"] = replica_set.pick(self._db.engines)
+            if self.info["replica"] is not None:
+                return self._db.engines[self.info["replica"]]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def configure(app, uris, **options):
+    # Registers one bind per replica URI; call before db.init_app
+    global replica_set
+    app.config["SQLALCHEMY_BINDS"] = {
+        bind_key(i): {"url": uri, **options} for i, uri in enumerate(uris)
+    }
+    replica_set = ReplicaSet([bind_key(i) for i in range(len(uris))])
+
+
+def use_replica(blueprint, db):
+    # Routes every request of the blueprint to a replica
+    @blueprint.before_request
+    def mark_read_only():
+        db.session.info["read_only"] = True
+
+
+def read_engine(db):
+    # Engine for reads outside the session, e.g. streaming exports
+    key = replica_set.pick(db.engines)
+    return db.engines[key] if key is not None else db.engine
@@ -0,0 +1,167 @@
+# Async versions of the trip endpoints served by asgi.py. Queries that don't
+# depend on each other are sent to MySQL at the same time.
+import asyncio
+from quart import Blueprint, Response, abort, jsonify, request
+from dimensions import dimensions
+from filters import FilterSpec
+import async_db
+import cold_storage
+import compression
+import counts
+import data_version
+import queries
+import serialization
+
+async_trips_bp = Blueprint('async_trips', __name__)
+
+
+async def _none():
+    return None
+
+
+async def trips_page(spec, page, fmt='rows'):
+    offset = (page - 1) * queries.PAGE_SIZE
+    results = []
+    # Cold months are older than anything in MySQL, so they come first
+    if cold_storage.covers(spec):
+        cold_total = await asyncio.to_thread(cold_storage.count, spec)
+        if offset < cold_total:
+            results = await asyncio.to_thread(
+                cold_storage.trips_slice, spec, offset, queries.PAGE_SIZE)
+        offset = max(0, offset - cold_total)
+
+    limit = queries.PAGE_SIZE - len(results)
+    if limit:
+        results += await async_db.fetch_all(
+            *queries.trips_slice(spec, offset, limit))
+    return queries.format_trips(results, fmt)
+
+
+async def spec_version(spec):
+    versions = data_version.fresh()
+    if versions is None:
+        versions = await async_db.run_sync_connection(data_version.current)
+    return data_version.version_of(versions, spec)
+
+
+async def trips_stats(spec, version):
+    stats = counts.cached_stats(spec, version)
+    if stats is None:
+        stats = await _compute_stats(spec)
+        counts.remember(spec, version, stats)
+    return stats
+
+
+async def _compute_stats(spec):
+    if cold_storage.covers(spec):
+        return await _merged_stats(spec)
+
+    totals, zones, hour_row = await asyncio.gather(
+        async_db.fetch_first(*queries.trip_totals(spec)),
+        _none() if spec.single_pickup_zone else async_db.fetch_all(
+            *queries.zone_counts(spec)),
+        async_db.fetch_first(*queries.peak_hour(spec)),
+    )
+    zone_row = None if spec.single_pickup_zone else queries.top_zone(zones)
+    return queries.format_stats(totals, zone_row, hour_row, spec.single_pickup_zone)
+
+
+async def _merged_stats(spec):
+    # MySQL and cold storage queried side by side, partial results combined
+    (hot_totals, hot_zones, hot_hours,
+     cold_totals, cold_zones, cold_hours) = await asyncio.gather(
+        async_db.fetch_first(*queries.trip_totals(spec)),
+        _none() if spec.single_pickup_zone else async_db.fetch_all(
+            *queries.zone_counts(spec)),
+        async_db.fetch_all(*queries.hour_counts(spec)),
+        asyncio.to_thread(cold_storage.totals, spec),
+        _none() if spec.single_pickup_zone else asyncio.to_thread(
+            cold_storage.zone_counts, spec),
+        asyncio.to_thread(cold_storage.hour_counts, spec),
+    )
+    totals = queries.merge_totals(hot_totals, cold_totals)
+    zone_row = None
+    if not spec.single_pickup_zone:
+        zone_row = queries.top_zone(hot_zones, cold_zones)
+    hour_row = queries.top_count(hot_hours, cold_hours)
+    return queries.format_stats(totals, zone_row, hour_row, spec.single_pickup_zone)
+
+
+def list_format():
+    fmt = request.args.get('format', 'rows')
+    if fmt not in queries.LIST_FORMATS:
+        abort(400, description="Invalid format. Expected one of: " +
+              ", ".join(queries.LIST_FORMATS))
+    return fmt
+
+
+@async_trips_bp.route('/trips', methods=['GET'])
+async def get_trips_data():
+    page = request.args.get('page', 1, type=int)
+    fmt = list_format()
+    spec = FilterSpec.from_args(request.args)
+    version = await spec_version(spec)
+
+    trips, (total, approximate) = await asyncio.gather(
+        trips_page(spec, page, fmt),
+        async_db.run_sync_connection(
+            lambda conn: counts.page_totals(conn, spec, version)),
+    )
+
+    return jsonify({
+        "trips": trips,
+        "page":  page,
+        "total": total,
+        "total_pages": counts.total_pages(total),
+        "total_approximate": approximate,
+    })
+
+
+@async_trips_bp.route('/stats', methods=['GET'])
+async def get_trips_stats():
+    spec = FilterSpec.from_args(request.args)
+    version = await spec_version(spec)
+    tag = data_version.etag('stats', spec, version)
+    if data_version.is_fresh(request, tag):
+        return data_version.not_modified(Response, tag)
+
+    return data_version.tag_response(jsonify(await trips_stats(spec, version)), tag)
+
+
+@async_trips_bp.route('/dashboard', methods=['GET'])
+async def get_dashboard():
+    page = request.args.get('page', 1, type=int)
+    fmt = list_format()
+    spec = FilterSpec.from_args(request.args)
+    version = await spec_version(spec)
+    tag = data_version.etag('dashboard', spec, version, page, fmt)
+    if data_version.is_fresh(request, tag):
+        return data_version.not_modified(Response, tag)
+
+    trips, stats = await asyncio.gather(
+        trips_page(spec, page, fmt),
+        trips_stats(spec, version),
+    )
+
+    return data_version.tag_response(jsonify({
+        "trips": trips,
+        "page":  page,
+        "total": stats["total_trips"],
+        "total_pages": counts.total_pages(stats["total_trips"]),
+        "total_approximate": False,
+        "stats": stats,
+    }), tag)
+
+
+@async_trips_bp.route('/zones', methods=['GET'])
+async def get_zones_geojson():
+    if not dimensions.loaded:
+        await async_db.run_sync(dimensions.load)
+    body, mimetype, encoding = dimensions.zones_body(
+        serialization.negotiate(request.accept_mimetypes),
+        compression.negotiate(request.accept_encodings))
+    response = Response(body, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
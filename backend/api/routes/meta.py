@@ -0,0 +1,42 @@
+# Dataset metadata for UIs: column ranges and histograms from the precomputed
+# profile, and the zone, vendor and payment type lists, all served from memory
+from flask import Blueprint, jsonify, request
+from models import db
+from dimensions import dimensions
+import data_version
+import replicas
+
+meta_bp = Blueprint('meta', __name__)
+replicas.use_replica(meta_bp, db)
+
+# Ingest saves the profile before bumping the months it loaded
+data_version.on_change(lambda months: setattr(dimensions, 'meta', None))
+
+
+def conditional(response, meta):
+    response.set_etag(f"meta-{meta['generated_at']}", weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def current_meta():
+    # Reading the versions (cached for DATA_VERSION_TTL) notices new loads
+    data_version.current(db.session.connection())
+    return dimensions.ensure_meta()
+
+
+@meta_bp.route('/meta', methods=['GET'])
+def get_meta():
+    meta = current_meta()
+    return conditional(jsonify(meta), meta)
+
+
+@meta_bp.route('/meta/ranges', methods=['GET'])
+def get_meta_ranges():
+    # Just the bounds, e.g. for filter sliders and date pickers
+    meta = current_meta()
+    ranges = {
+        name: {key: column.get(key) for key in ('min', 'max', 'p99', 'nulls')}
+        for name, column in meta['columns'].items()
+    }
+    return conditional(jsonify({"rows": meta['rows'], "ranges": ranges}), meta)
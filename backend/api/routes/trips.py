@@ -1,213 +1,196 @@
-from flask import Blueprint, jsonify, request, abort
-from models import db, Trip, Location
-from sqlalchemy.sql import func
-from sqlalchemy import extract
-from datetime import datetime
+from flask import Blueprint, Response, g, jsonify, request, abort, stream_with_context
+from models import db
+from dimensions import dimensions
+from filters import FilterSpec
+import admission
+import cold_storage
+import compression
+import counts
+import data_version
+import export
+import queries
+import query_log
+import replicas
+import serialization
+import timeouts
+from singleflight import single_flight
 
 trips_bp = Blueprint('trips', __name__)
+# Every route here only reads
+replicas.use_replica(trips_bp, db)
+timeouts.init_blueprint(trips_bp, db)
+query_log.init_blueprint(trips_bp)
+
+
+def request_spec():
+    # Parsed once per request; the query log records it after the response
+    g.filter_spec = FilterSpec.from_args(request.args)
+    return g.filter_spec
+
+
+def trips_page(spec, page, fmt='rows'):
+    offset = (page - 1) * queries.PAGE_SIZE
+    results = []
+    # Cold months are older than anything in MySQL, so they come first
+    if cold_storage.covers(spec):
+        cold_total = cold_storage.count(spec)
+        if offset < cold_total:
+            results = cold_storage.trips_slice(spec, offset, queries.PAGE_SIZE)
+        offset = max(0, offset - cold_total)
+
+    limit = queries.PAGE_SIZE - len(results)
+    if limit:
+        results += db.session.execute(
+            *queries.trips_slice(spec, offset, limit)).all()
+    return queries.format_trips(results, fmt)
+
+
+def trips_stats(spec, version):
+    stats = counts.cached_stats(spec, version)
+    if stats is not None:
+        return stats
+    # Identical requests arriving together (e.g. every dashboard opening on the
+    # default filters) wait for one computation. If the request computing it
+    # is cancelled because its client left, the others compute it themselves.
+    stats = single_flight.do(data_version.etag('stats', spec, version),
+                             lambda: _admitted_stats(spec),
+                             retry=timeouts.is_cancelled)
+    if not stats.get('approximate'):
+        counts.remember(spec, version, stats)
+    return stats
+
+
+def _admitted_stats(spec):
+    try:
+        with admission.controller.admit(admission.cost(spec)):
+            return _compute_stats(spec)
+    except admission.Overloaded:
+        # Degrade to the last answer for these filters, if there is one; it
+        # predates the newest data version and gets no ETag
+        stale = counts.stale_stats(spec)
+        if stale is None:
+            raise
+        return dict(stale, approximate=True)
+
+
+def tag_stats_response(response, stats, tag):
+    if stats.get('approximate'):
+        return response
+    return data_version.tag_response(response, tag)
+
+
+def _compute_stats(spec):
+    cold = cold_storage.covers(spec)
+    totals = db.session.execute(*queries.trip_totals(spec)).first()
+    if cold:
+        totals = queries.merge_totals(totals, cold_storage.totals(spec))
+    total_trips = totals[0] or 0
+
+    zone_row = None
+    hour_row = None
+    if total_trips > 0:
+        if not spec.single_pickup_zone:
+            zone_row = queries.top_zone(
+                db.session.execute(*queries.zone_counts(spec)).all(),
+                cold_storage.zone_counts(spec) if cold else [])
+        if cold:
+            hour_row = queries.top_count(
+                db.session.execute(*queries.hour_counts(spec)).all(),
+                cold_storage.hour_counts(spec))
+        else:
+            hour_row = db.session.execute(*queries.peak_hour(spec)).first()
+
+    return queries.format_stats(totals, zone_row, hour_row, spec.single_pickup_zone)
 
 
-def apply_trip_filters(query):
-    pickup_hour = request.args.get('pickup_hour', type=int)
-    if pickup_hour is not None:
-        query = query.filter(
-            extract('hour', Trip.tpep_pickup_datetime) == pickup_hour
-        )
-
-    dropoff_hour = request.args.get('dropoff_hour', type=int)
-    if dropoff_hour is not None:
-        query = query.filter(
-            extract('hour', Trip.tpep_dropoff_datetime) == dropoff_hour
-        )
-
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-
-    if not date_from and not date_to:
-        date_from = '2019-01-01'
-        date_to = '2019-01-01'
-
-    if date_from:
-        try:
-            query = query.filter(
-                Trip.tpep_pickup_datetime >= datetime.strptime(
-                    date_from, '%Y-%m-%d')
-            )
-        except ValueError:
-            abort(400, description="Invalid date_from format. Expected YYYY-MM-DD")
-    if date_to:
-        try:
-            # Set to end of day to include all trips on date_to
-            date_to_dt = datetime.strptime(date_to, '%Y-%m-%d')
-            date_to_dt = date_to_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(
-                Trip.tpep_pickup_datetime <= date_to_dt
-            )
-        except ValueError:
-            abort(400, description="Invalid date_to format. Expected YYYY-MM-DD")
-
-    min_pass = request.args.get('min_passengers', type=int)
-    max_pass = request.args.get('max_passengers', type=int)
-    if min_pass is not None:
-        query = query.filter(Trip.passenger_count >= min_pass)
-    if max_pass is not None:
-        query = query.filter(Trip.passenger_count <= max_pass)
-
-    min_dist = request.args.get('min_distance', type=float)
-    max_dist = request.args.get('max_distance', type=float)
-    if min_dist is not None:
-        query = query.filter(Trip.trip_distance >= min_dist)
-    if max_dist is not None:
-        query = query.filter(Trip.trip_distance <= max_dist)
-
-    min_fare = request.args.get('min_fare', type=float)
-    max_fare = request.args.get('max_fare', type=float)
-    if min_fare is not None:
-        query = query.filter(Trip.fare_amount >= min_fare)
-    if max_fare is not None:
-        query = query.filter(Trip.fare_amount <= max_fare)
-
-    return query
-
-
-def apply_location_filters(query, pickup_loc, dropoff_loc):
-    pickup_zone = request.args.get('pickup_zone')
-    if pickup_zone and pickup_zone not in ('All', 'Any'):
-        query = query.filter(pickup_loc.Zone == pickup_zone)
-
-    dropoff_zone = request.args.get('dropoff_zone')
-    if dropoff_zone and dropoff_zone not in ('All', 'Any'):
-        query = query.filter(dropoff_loc.Zone == dropoff_zone)
-
-    return query
+def list_format():
+    fmt = request.args.get('format', 'rows')
+    if fmt not in queries.LIST_FORMATS:
+        abort(400, description="Invalid format. Expected one of: " +
+              ", ".join(queries.LIST_FORMATS))
+    return fmt
 
 
 @trips_bp.route('/trips', methods=['GET'])
 def get_trips_data():
     page = request.args.get('page', 1, type=int)
-
-    pickup_loc = db.aliased(Location, name='pickup')
-    dropoff_loc = db.aliased(Location, name='dropoff')
-
-    query = (
-        db.session.query(Trip, pickup_loc, dropoff_loc)
-        .join(pickup_loc, Trip.PULocationID == pickup_loc.LocationID)
-        .join(dropoff_loc, Trip.DOLocationID == dropoff_loc.LocationID)
-    )
-    query = apply_trip_filters(query)
-    query = apply_location_filters(query, pickup_loc, dropoff_loc)
-
-    results = query.limit(15).offset((page - 1) * 15).all()
-
-    trips_list = []
-    for trip, pu_loc, do_loc in results:
-        trips_list.append({
-            "no":           trip.trip_id,
-            "pickup_time":  str(trip.tpep_pickup_datetime),
-            "dropoff_time": str(trip.tpep_dropoff_datetime),
-            "pickup_zone":  pu_loc.Zone,
-            "dropoff_zone": do_loc.Zone,
-            "distance":     float(trip.trip_distance or 0),
-            "passengers":   trip.passenger_count,
-            "fare":         float(trip.fare_amount or 0),
-            "tip":          float(trip.tip_amount or 0),
-            "total":        float(trip.total_amount or 0),
-        })
+    fmt = list_format()
+    spec = request_spec()
+    connection = db.session.connection()
+    version = data_version.for_spec(connection, spec)
+    total, approximate = counts.page_totals(connection, spec, version)
 
     return jsonify({
-        "trips": trips_list,
+        "trips": trips_page(spec, page, fmt),
         "page":  page,
+        "total": total,
+        "total_pages": counts.total_pages(total),
+        "total_approximate": approximate,
+    })
+
+
+@trips_bp.route('/trips/export', methods=['GET'])
+def export_trips():
+    # Streams every matching trip in trip_id order; pass after=<last no> to resume
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        abort(400, description="Invalid format. Expected one of: " +
+              ", ".join(export.FORMATS))
+    if fmt in export.ARROW_FORMATS and export.pa is None:
+        abort(501, description="Arrow and Parquet exports need pyarrow installed")
+    after = request.args.get('after', 0, type=int)
+    spec = request_spec()
+
+    encode, mimetype = export.FORMATS[fmt]
+    body = encode(export.stream_rows(spec, after))
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=trips.{fmt}",
+        "X-Accel-Buffering": "no",
     })
 
 
 @trips_bp.route('/stats', methods=['GET'])
 def get_trips_stats():
-    pickup_loc = db.aliased(Location, name='pickup')
-    dropoff_loc = db.aliased(Location, name='dropoff')
-
-    query = (
-        db.session.query(Trip)
-        .join(pickup_loc, Trip.PULocationID == pickup_loc.LocationID)
-        .join(dropoff_loc, Trip.DOLocationID == dropoff_loc.LocationID)
-    )
-    query = apply_trip_filters(query)
-    query = apply_location_filters(query, pickup_loc, dropoff_loc)
-
-    stats = query.with_entities(
-        func.count(),
-        func.avg(Trip.fare_amount),
-        func.avg(Trip.trip_distance),
-        func.avg(Trip.tip_amount / func.nullif(Trip.fare_amount, 0))
-    ).first()
-
-    total_trips = stats[0] or 0
-    avg_fare = round(float(stats[1] or 0), 2)
-    avg_distance = round(float(stats[2] or 0), 1)
-    avg_tip_pct = round(float(stats[3] or 0) * 100, 1)
-
-    pickup_zone = request.args.get('pickup_zone')
-    best_zone = pickup_zone if (
-        pickup_zone and pickup_zone not in ('Any', 'All')) else None
-
-    if not best_zone and total_trips > 0:
-        zone_counts_query = query.with_entities(
-            pickup_loc.Zone, func.count()
-        ).group_by(pickup_loc.Zone).order_by(func.count().desc()).first()
-
-        best_zone = zone_counts_query[0] if zone_counts_query else "N/A"
-    elif not best_zone:
-        best_zone = "N/A"
-
-    peak_hour = "N/A"
-    if total_trips > 0:
-        ph_res = query.with_entities(
-            extract('hour', Trip.tpep_pickup_datetime), func.count()
-        ).group_by(
-            extract('hour', Trip.tpep_pickup_datetime)
-        ).order_by(func.count().desc()).first()
-
-        if ph_res:
-            h = int(ph_res[0])
-            suffix = 'AM' if h < 12 else 'PM'
-            display_h = h % 12 or 12
-            peak_hour = f"{display_h}:00 {suffix}"
+    spec = request_spec()
+    version = data_version.for_spec(db.session.connection(), spec)
+    tag = data_version.etag('stats', spec, version)
+    if data_version.is_fresh(request, tag):
+        return data_version.not_modified(Response, tag)
 
-    return jsonify({
-        "total_trips":  total_trips,
-        "avg_fare":     avg_fare,
-        "avg_distance": avg_distance,
-        "avg_tip_pct":  avg_tip_pct,
-        "best_zone":    best_zone,
-        "peak_hour":    peak_hour,
-    })
+    stats = trips_stats(spec, version)
+    return tag_stats_response(jsonify(stats), stats, tag)
+
+
+@trips_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    # Trips page and stats for the same filters, parsed once and run on one connection
+    page = request.args.get('page', 1, type=int)
+    fmt = list_format()
+    spec = request_spec()
+    version = data_version.for_spec(db.session.connection(), spec)
+    tag = data_version.etag('dashboard', spec, version, page, fmt)
+    if data_version.is_fresh(request, tag):
+        return data_version.not_modified(Response, tag)
+    stats = trips_stats(spec, version)
+
+    return tag_stats_response(jsonify({
+        "trips": trips_page(spec, page, fmt),
+        "page":  page,
+        "total": stats["total_trips"],
+        "total_pages": counts.total_pages(stats["total_trips"]),
+        "total_approximate": stats.get('approximate', False),
+        "stats": stats,
+    }), stats, tag)
 
 
 @trips_bp.route('/zones', methods=['GET'])
 def get_zones_geojson():
-    locations = db.session.query(
-        Location.LocationID,
-        Location.Borough,
-        Location.Zone,
-        Location.service_zone,
-        Location.geometry
-    ).all()
-
-    features = []
-    for loc in locations:
-        if not loc.geometry:
-            continue
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "LocationID": loc.LocationID,
-                "borough": loc.Borough or "Unknown",
-                "zone": loc.Zone or "Unknown",
-                "service_zone": loc.service_zone or "",
-            },
-            "geometry": loc.geometry
-        })
-
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": features
-    })
+    # Served from the preloaded, pre-encoded dimension data
+    body, mimetype, encoding = dimensions.ensure_loaded().zones_body(
+        serialization.negotiate(request.accept_mimetypes),
+        compression.negotiate(request.accept_encodings))
+    response = Response(body, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
@@ -0,0 +1,90 @@
+# Response serialization. JSON is encoded with orjson when it is installed
+# (stdlib json otherwise), and clients that send "Accept: application/msgpack"
+# get MessagePack instead. Installed as the app's JSON provider, so every
+# jsonify() in the Flask and Quart apps goes through it.
+import datetime
+import json
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Accepted spellings of the MessagePack media type; responses use MSGPACK
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps(obj, mimetype=JSON, indent=False):
+    # Returns bytes; keys are sorted, like Flask's default provider
+    if mimetype == MSGPACK:
+        return msgpack.packb(obj, default=_default, datetime=False)
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(obj, default=_default, sort_keys=True,
+                      indent=2 if indent else None,
+                      separators=None if indent else (",", ":")).encode("utf-8")
+
+
+def negotiate(accept):
+    # Picks JSON or MessagePack from a request's Accept header (a werkzeug MIMEAccept)
+    if msgpack is None or accept is None:
+        return JSON
+    best = accept.best_match((JSON,) + MSGPACK_TYPES, default=JSON)
+    return MSGPACK if best in MSGPACK_TYPES else JSON
+
+
+class FastJSONProvider(JSONProvider):
+    # request_proxy is flask.request for the Flask app and quart.request for Quart
+    compact = None
+
+    def __init__(self, app, request_proxy=None):
+        super().__init__(app)
+        if request_proxy is None:
+            from flask import request as request_proxy
+        self.request_proxy = request_proxy
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, indent=bool(kwargs.get("indent"))).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def _accept(self):
+        try:
+            return self.request_proxy.accept_mimetypes
+        except RuntimeError:
+            # Outside a request
+            return None
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        mimetype = negotiate(self._accept())
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps(obj, mimetype, indent)
+        if mimetype == JSON:
+            body += b"\n"
+        response = self._app.response_class(body, mimetype=mimetype)
+        response.vary.add("Accept")
+        return response
@@ -0,0 +1,148 @@
+# Coalesces identical computations that are in flight at the same time. Within
+# a worker, the first caller for a key (the leader) runs it and the others wait
+# for its result. Across the workers on a host, leaders take a flock'd file per
+# key under SINGLEFLIGHT_DIR and write their result next to it, so a leader
+# that had to wait for the lock reads that result instead of computing again.
+# Results shared across workers must be JSON serializable.
+#
+# A leader's failure is the followers' failure too, except when `retry` says
+# it was specific to the leader (e.g. its query was killed because its client
+# disconnected): then the followers elect a new leader among themselves.
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import serialization
+
+try:
+    import fcntl
+except ImportError:
+    # Coalescing stays within each worker
+    fcntl = None
+
+SINGLEFLIGHT_DIR = os.getenv(
+    "SINGLEFLIGHT_DIR", os.path.join(tempfile.gettempdir(), "trips-singleflight"))
+# Longest a caller waits for another's result before computing it itself
+SINGLEFLIGHT_WAIT = float(os.getenv("SINGLEFLIGHT_WAIT", 30))
+# Result and lock files older than this are removed by the next leader
+SINGLEFLIGHT_KEEP = 60
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # The call retrying this one after a retryable error
+        self.retry = None
+
+
+class SingleFlight:
+    def __init__(self, directory=SINGLEFLIGHT_DIR, wait=SINGLEFLIGHT_WAIT):
+        self.directory = directory
+        self.wait = wait
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute, retry=None):
+        # retry(error) -> True when a leader's error shouldn't fail its followers
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        while not leader:
+            if not call.done.wait(self.wait):
+                return compute()
+            if call.error is None:
+                return call.value
+            if retry is None or not retry(call.error):
+                # Each follower raises its own copy; the leader's is being
+                # raised in its thread at the same time
+                raise copy.copy(call.error) from call.error
+            with self._lock:
+                # The first follower back leads the retry, unless a new caller
+                # already started one; the rest follow it even once it's done
+                if call.retry is None:
+                    call.retry = self._calls.get(key)
+                    if call.retry is None:
+                        call.retry = self._calls[key] = _Call()
+                        leader = True
+                call = call.retry
+
+        try:
+            call.value = self._across_workers(key, compute)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def _across_workers(self, key, compute):
+        if fcntl is None:
+            return compute()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+        started = time.time()
+        with open(path + ".lock", "ab") as handle:
+            if not self._lock_file(handle, time.monotonic() + self.wait):
+                return compute()
+            # Keeps the lock file from being pruned while it is in use
+            os.utime(path + ".lock")
+            try:
+                # Written by a leader in another worker while this one waited
+                value = self._read_result(path + ".json", started)
+                if value is not None:
+                    return value
+                value = compute()
+                self._write_result(path + ".json", value)
+                return value
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _lock_file(self, handle, deadline):
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(POLL_INTERVAL)
+
+    def _read_result(self, path, started):
+        try:
+            if os.stat(path).st_mtime < started:
+                return None
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path, value):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(serialization.dumps(value))
+        os.replace(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        # Removing a lock file someone still waits on only costs a duplicate
+        # computation: the next caller creates a new one
+        cutoff = time.time() - SINGLEFLIGHT_KEEP
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# The API modules import each other by their top-level names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dimensions import dimensions
+
+# LocationID -> (borough, zone); two IDs share a zone name, as in the real data
+LOCATIONS = {
+    1: ("EWR", "Newark Airport"),
+    2: ("Queens", "Jamaica Bay"),
+    3: ("Bronx", "Allerton/Pelham Gardens"),
+    4: ("Manhattan", "Alphabet City"),
+    56: ("Queens", "Corona"),
+    57: ("Queens", "Corona"),
+}
+
+
+@pytest.fixture
+def zones(monkeypatch):
+    # The location dimension without a database
+    values = {
+        "locations": {}, "zone_ids": {}, "borough_ids": {},
+        "zone_names": {}, "borough_names": {},
+    }
+    for location_id, (borough, zone) in LOCATIONS.items():
+        values["locations"][location_id] = {"borough": borough, "zone": zone, "service_zone": ""}
+        values["zone_ids"].setdefault(zone.lower(), []).append(location_id)
+        values["borough_ids"].setdefault(borough.lower(), []).append(location_id)
+        values["zone_names"].setdefault(zone.lower(), zone)
+        values["borough_names"].setdefault(borough.lower(), borough)
+    for name, value in values.items():
+        monkeypatch.setattr(dimensions, name, value)
+    monkeypatch.setattr(dimensions, "loaded", True)
+    return dimensions
@@ -0,0 +1,47 @@
+from datetime import date
+import pytest
+from filters import FilterSpec
+import admission
+
+JANUARY = {"date_from": date(2019, 1, 1), "date_to": date(2019, 1, 31)}
+
+
+def cost(**values):
+    return admission.cost(FilterSpec(**values))
+
+
+def test_days_in_range(zones):
+    assert cost(**JANUARY) == 31
+    assert cost(date_from=date(2019, 1, 1), date_to=date(2019, 1, 1)) == 1
+
+
+def test_reversed_range_costs_a_day(zones):
+    assert cost(date_from=date(2019, 1, 31), date_to=date(2019, 1, 1)) == 1
+
+
+@pytest.mark.parametrize("values", [
+    {"date_from": date(2019, 1, 1)},
+    {"date_to": date(2019, 1, 1)},
+    {},
+])
+def test_open_range(zones, values):
+    assert cost(**values) == admission.OPEN_RANGE_DAYS
+
+
+def test_locations_narrow_the_cost(zones):
+    # Corona is 2 of the 6 LocationIDs, Queens 3
+    assert cost(pickup_zone=("Corona",), **JANUARY) == pytest.approx(31 * 2 / 6)
+    assert cost(dropoff_borough=("Queens",), **JANUARY) == pytest.approx(31 * 3 / 6)
+
+
+def test_most_selective_location_filter_counts(zones):
+    assert cost(pickup_borough=("Queens",), dropoff_zone=("Corona",), **JANUARY) == \
+        pytest.approx(31 * 2 / 6)
+
+
+def test_other_filters_dont_narrow(zones):
+    assert cost(min_fare=50.0, pickup_hour=3, max_passengers=1, **JANUARY) == 31
+
+
+def test_default_view_is_cheap(zones):
+    assert admission.cost(FilterSpec.from_lists({})) < admission.ADMISSION_HEAVY_COST
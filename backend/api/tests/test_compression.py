@@ -0,0 +1,43 @@
+import pytest
+from werkzeug.http import parse_accept_header
+import compression
+
+ALL = ["zstd", "br", "gzip"]
+
+
+def negotiate(header):
+    return compression.negotiate(parse_accept_header(header))
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    # As if every optional codec were installed
+    monkeypatch.setattr(compression, "ENCODINGS", ALL)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br, zstd", "zstd"),
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("*", "zstd"),
+    ("*;q=0.5, gzip", "gzip"),
+    ("zstd;q=0, *", "br"),
+    ("deflate", None),
+    ("identity", None),
+    ("", None),
+    ("gzip;q=0", None),
+])
+def test_negotiate(installed, header, expected):
+    assert negotiate(header) == expected
+
+
+def test_only_installed_encodings(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODINGS", ["gzip"])
+    assert negotiate("zstd, br") is None
+    assert negotiate("zstd, br, gzip;q=0.1") == "gzip"
+
+
+def test_gzip_is_always_available():
+    assert "gzip" in compression.ENCODINGS
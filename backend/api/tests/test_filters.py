@@ -0,0 +1,77 @@
+from datetime import date
+import pytest
+from werkzeug.datastructures import MultiDict
+from filters import DEFAULT_DATE, FilterSpec
+
+
+def spec(*pairs):
+    return FilterSpec.from_args(MultiDict(pairs))
+
+
+def test_defaults_to_one_day():
+    default = spec()
+    assert (default.date_from, default.date_to) == (DEFAULT_DATE, DEFAULT_DATE)
+    assert default == spec(("date_from", "2019-01-01"), ("date_to", "2019-01-01"))
+
+
+def test_one_date_keeps_the_range_open():
+    open_range = spec(("date_from", "2019-03-01"))
+    assert open_range.date_from == date(2019, 3, 1)
+    assert open_range.date_to is None
+    assert open_range.shape == ("date_from",)
+
+
+def test_order_and_duplicates_of_names_dont_matter(zones):
+    a = spec(("pickup_zone", "Corona"), ("pickup_zone", "Jamaica Bay"))
+    b = spec(("pickup_zone", "Jamaica Bay"), ("pickup_zone", "Corona"),
+             ("pickup_zone", "Corona"))
+    assert a == b
+    assert a.key == b.key
+    assert a.digest == b.digest
+    assert hash(a) == hash(b)
+    assert a.pickup_zone == ("Corona", "Jamaica Bay")
+
+
+def test_names_are_canonical(zones):
+    typed = spec(("pickup_zone", "corona"), ("dropoff_borough", "QUEENS"))
+    assert typed == spec(("pickup_zone", "Corona"), ("dropoff_borough", "Queens"))
+    assert typed.pickup_zone == ("Corona",)
+    assert typed.single_pickup_zone == "Corona"
+    # Unknown names still can't split keys by case
+    assert spec(("pickup_zone", "Nowhere")) == spec(("pickup_zone", "NOWHERE"))
+
+
+def test_all_and_empty_names_are_no_filter(zones):
+    assert spec(("pickup_zone", "All"), ("dropoff_borough", "Any"), ("pickup_zone", "")) == spec()
+
+
+def test_numbers_compare_by_value():
+    assert spec(("min_fare", "5")) == spec(("min_fare", "5.0"))
+    assert spec(("min_fare", "5")).digest == spec(("min_fare", "5.0")).digest
+    assert spec(("min_passengers", "2")) != spec(("min_passengers", "3"))
+
+
+def test_round_trip(zones):
+    original = spec(("date_from", "2019-01-05"), ("date_to", "2019-01-20"),
+                    ("pickup_zone", "corona"), ("pickup_zone", "Alphabet City"),
+                    ("dropoff_borough", "Queens"), ("min_fare", "2.5"),
+                    ("max_duration", "30"), ("pickup_hour", "8"))
+    args = original.to_args()
+    assert args["pickup_zone"] == ["Alphabet City", "Corona"]
+    assert args["date_from"] == ["2019-01-05"]
+    copy = FilterSpec.from_lists(args)
+    assert copy == original
+    assert copy.digest == original.digest
+
+
+def test_params_resolve_names_and_units(zones):
+    params = spec(("pickup_zone", "Corona"), ("dropoff_borough", "queens"),
+                  ("max_duration", "1.5")).params()
+    assert params["pickup_zone"] == [56, 57]
+    assert params["dropoff_borough"] == [2, 56, 57]
+    assert params["max_duration"] == 90
+
+
+def test_immutable():
+    with pytest.raises(AttributeError):
+        spec().min_fare = 1
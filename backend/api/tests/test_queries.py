@@ -0,0 +1,52 @@
+# trips is range-partitioned by month on tpep_pickup_datetime
+# (database/partitioning.py). MySQL only prunes partitions for plain
+# comparisons of that column with constants, so the date filters must reach
+# it unwrapped in every statement, whatever else is filtered on.
+import re
+from datetime import date, datetime
+import pytest
+from sqlalchemy.dialects import mysql
+from filters import FilterSpec
+import queries
+
+DIALECT = mysql.dialect(paramstyle="pyformat")
+DATES = {"date_from": date(2019, 1, 5), "date_to": date(2019, 1, 20)}
+EVERY_FILTER = dict(
+    DATES, pickup_hour=8, dropoff_hour=9, min_passengers=1, max_passengers=4,
+    min_distance=0.5, max_distance=20.0, min_fare=2.5, max_fare=80.0,
+    min_duration=1.0, max_duration=60.0, pickup_zone=("Corona",), dropoff_zone=("Corona",),
+    pickup_borough=("Queens",), dropoff_borough=("Queens",))
+SPECS = {
+    "date range": FilterSpec(**DATES),
+    "date range and every filter": FilterSpec(**EVERY_FILTER),
+}
+PRUNABLE = [
+    "trips.tpep_pickup_datetime >= %(date_from)s",
+    "trips.tpep_pickup_datetime <= %(date_to)s",
+]
+# Not prunable, but it only narrows the rows of the pruned partitions
+HOUR_FILTER = "EXTRACT(hour FROM trips.tpep_pickup_datetime) = %(pickup_hour)s"
+
+
+def where_clause(kind, spec):
+    sql = " ".join(str(queries.statement(kind, spec).compile(dialect=DIALECT)).split())
+    where = sql.split(" WHERE ", 1)[1]
+    return re.split(r" (?:GROUP BY|ORDER BY|LIMIT) ", where, 1)[0]
+
+
+@pytest.mark.parametrize("kind", sorted(queries.BUILDERS))
+@pytest.mark.parametrize("name", sorted(SPECS))
+def test_date_filters_are_sargable(kind, name):
+    where = where_clause(kind, SPECS[name])
+    for predicate in PRUNABLE:
+        assert predicate in where
+        where = where.replace(predicate, "")
+    where = where.replace(HOUR_FILTER, "")
+    # No other reference, e.g. through DATE() or a cast
+    assert "tpep_pickup_datetime" not in where
+
+
+def test_date_params_are_datetimes():
+    params = SPECS["date range"].params()
+    assert params["date_from"] == datetime(2019, 1, 5, 0, 0, 0)
+    assert params["date_to"] == datetime(2019, 1, 20, 23, 59, 59)
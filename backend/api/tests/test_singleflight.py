@@ -0,0 +1,135 @@
+import threading
+import time
+import pytest
+from singleflight import SingleFlight
+
+FOLLOWERS = 4
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Failed(Exception):
+    pass
+
+
+@pytest.fixture
+def flight(tmp_path):
+    return SingleFlight(directory=str(tmp_path), wait=5)
+
+
+def run_followers(flight, compute, retry=None):
+    # Starts the followers while the leader's compute is blocked, then lets it
+    # finish; returns what each follower got, a result or an exception
+    outcomes = [None] * FOLLOWERS
+
+    def follow(i):
+        try:
+            outcomes[i] = flight.do("key", compute, retry)
+        except Exception as error:
+            outcomes[i] = error
+
+    threads = [threading.Thread(target=follow, args=(i,)) for i in range(FOLLOWERS)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def leader(flight, compute, retry=None):
+    # Runs the leader in a thread; compute must wait on `release`
+    outcome = {}
+
+    def lead():
+        try:
+            outcome["value"] = flight.do("key", compute, retry)
+        except Exception as error:
+            outcome["error"] = error
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    return thread, outcome
+
+
+def test_followers_share_the_result(flight):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"total": 42}
+
+    lead, outcome = leader(flight, compute)
+    assert started.wait(5)
+    threads, outcomes = run_followers(flight, compute)
+    time.sleep(0.2)
+    release.set()
+    for thread in [lead] + threads:
+        thread.join(5)
+    assert outcome["value"] == {"total": 42}
+    assert outcomes == [{"total": 42}] * FOLLOWERS
+    assert len(calls) == 1
+
+
+def test_leader_failure_fails_followers(flight):
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise Failed("boom")
+
+    lead, outcome = leader(flight, compute)
+    assert started.wait(5)
+    threads, outcomes = run_followers(flight, compute)
+    time.sleep(0.2)
+    release.set()
+    for thread in [lead] + threads:
+        thread.join(5)
+    assert isinstance(outcome["error"], Failed)
+    assert all(isinstance(error, Failed) for error in outcomes)
+    # Each thread raises its own copy, chained to the leader's
+    assert len({id(error) for error in outcomes + [outcome["error"]]}) == FOLLOWERS + 1
+    assert all(error.__cause__ is outcome["error"] for error in outcomes)
+
+
+def test_followers_elect_a_new_leader_on_retryable_failure(flight):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            # The first leader's query is cancelled after the followers joined
+            started.set()
+            release.wait(5)
+            raise Cancelled()
+        return "fresh"
+
+    def retry(error):
+        return isinstance(error, Cancelled)
+
+    lead, outcome = leader(flight, compute, retry)
+    assert started.wait(5)
+    threads, outcomes = run_followers(flight, compute, retry)
+    time.sleep(0.2)
+    release.set()
+    for thread in [lead] + threads:
+        thread.join(5)
+    assert isinstance(outcome["error"], Cancelled)
+    assert outcomes == ["fresh"] * FOLLOWERS
+    # One new leader computed for all the followers
+    assert len(calls) == 2
+
+
+def test_sequential_calls_compute_again(flight):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("key", compute) == 1
+    assert flight.do("key", compute) == 2
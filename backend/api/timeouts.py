@@ -0,0 +1,198 @@
+# Statement time budgets and cancellation of queries whose client went away.
+#
+# Each read endpoint gets a MAX_EXECUTION_TIME for its session's connection;
+# MySQL stops a SELECT that runs longer and the request ends with 504. The
+# setting is undone when the connection goes back to the pool, so it never
+# applies to whatever borrows the connection next. While
+# the request runs, a watcher thread polls the client socket and sends
+# KILL QUERY for the connection's statement as soon as the client hangs up
+# (the dashboard aborts its previous fetch whenever a filter changes).
+import os
+import selectors
+import socket
+import threading
+from flask import g, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import Pool
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable
+
+# Milliseconds per endpoint; 0 means no limit. Other endpoints aren't touched.
+BUDGETS = {
+    "trips.get_trips_data": int(os.getenv("TRIPS_TIMEOUT_MS", 5000)),
+    "trips.get_trips_stats": int(os.getenv("STATS_TIMEOUT_MS", 15000)),
+    "trips.get_dashboard": int(os.getenv("DASHBOARD_TIMEOUT_MS", 15000)),
+}
+# Exports stream on their own connection (export.py), which sets this budget
+# and cancels its query itself when the download is aborted
+EXPORT_BUDGET = int(os.getenv("EXPORT_TIMEOUT_MS", 0))
+POLL_INTERVAL = 0.25
+
+# MySQL error codes
+MAX_EXECUTION_TIME_EXCEEDED = 3024
+QUERY_INTERRUPTED = 1317
+
+
+def set_budget(connection, budget_ms):
+    if connection.dialect.name == "mysql":
+        connection.exec_driver_sql(f"SET SESSION max_execution_time = {int(budget_ms)}")
+        # Tells the reset listener below to undo it
+        connection.info["execution_budget"] = True
+
+
+@event.listens_for(Pool, "reset")
+def reset_budget(dbapi_connection, connection_record, reset_state):
+    # Pooled connections keep session variables; back to the server's default
+    # before anyone else gets this one. If this fails, the pool discards the
+    # connection.
+    if not connection_record.info.pop("execution_budget", False):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SET SESSION max_execution_time = DEFAULT")
+    finally:
+        cursor.close()
+
+
+def thread_id(connection):
+    # Server-side id of the connection, as used by KILL
+    if connection.dialect.name != "mysql":
+        return None
+    dbapi_connection = connection.connection.dbapi_connection
+    if hasattr(dbapi_connection, "thread_id"):
+        return dbapi_connection.thread_id()
+    return connection.exec_driver_sql("SELECT CONNECTION_ID()").scalar()
+
+
+def kill_query(engine, server_thread_id):
+    # Runs on another connection of the same server; the killed statement's
+    # connection stays usable
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f"KILL QUERY {int(server_thread_id)}")
+    except exc.DBAPIError:
+        pass
+
+
+def client_socket(environ):
+    return environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+
+
+class DisconnectWatcher:
+    # One thread per worker watching the sockets of the requests in flight
+    def __init__(self):
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, sock, engine, server_thread_id):
+        with self._lock:
+            self._watched[sock] = (engine, server_thread_id)
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily, so each forked worker gets its own
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="disconnect-watcher")
+                self._thread.start()
+
+    def unwatch(self, sock):
+        with self._lock:
+            self._watched.pop(sock, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                socks = list(self._watched)
+            if not socks:
+                threading.Event().wait(POLL_INTERVAL)
+                continue
+            # select.select can't take descriptors above FD_SETSIZE (1024),
+            # which a busy worker reaches; the default selector (epoll/poll)
+            # has no such limit
+            readable = []
+            with selectors.DefaultSelector() as selector:
+                for sock in socks:
+                    try:
+                        selector.register(sock, selectors.EVENT_READ)
+                    except (OSError, ValueError):
+                        # Closed between listing and registering
+                        readable.append(sock)
+                if not readable:
+                    try:
+                        readable = [key.fileobj for key, _ in selector.select(POLL_INTERVAL)]
+                    except OSError:
+                        # Never spin on a persistent error
+                        threading.Event().wait(POLL_INTERVAL)
+            for sock in readable:
+                self._check(sock)
+
+    def _check(self, sock):
+        try:
+            gone = sock.fileno() < 0 or \
+                sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return
+        except OSError:
+            gone = True
+        with self._lock:
+            target = self._watched.pop(sock, None)
+        # A readable socket with data is a pipelined request, not a hang-up;
+        # it can't be watched further either way
+        if gone and target is not None:
+            kill_query(*target)
+
+
+watcher = DisconnectWatcher()
+
+
+def init_blueprint(blueprint, db):
+    # Sets the endpoint's budget on the request's session connection and
+    # watches the client for as long as the handler runs
+    @blueprint.before_request
+    def start_budget():
+        if request.endpoint not in BUDGETS:
+            return
+        connection = db.session.connection()
+        set_budget(connection, BUDGETS[request.endpoint])
+        sock = client_socket(request.environ)
+        server_thread_id = thread_id(connection)
+        if sock is not None and server_thread_id is not None:
+            g.watched_socket = sock
+            watcher.watch(sock, connection.engine, server_thread_id)
+
+    @blueprint.teardown_request
+    def stop_watching(error=None):
+        sock = g.pop("watched_socket", None)
+        if sock is not None:
+            watcher.unwatch(sock)
+
+
+def error_code(error):
+    # MySQL error number of a DBAPIError, or None
+    orig = getattr(error, "orig", None)
+    return orig.args[0] if orig is not None and orig.args else None
+
+
+def is_cancelled(error):
+    # The query was killed, e.g. by the watcher after its client left, rather
+    # than failing on its own
+    return isinstance(error, exc.OperationalError) and error_code(error) == QUERY_INTERRUPTED
+
+
+def init_app(app):
+    @app.errorhandler(exc.OperationalError)
+    def query_interrupted(error):
+        code = error_code(error)
+        if code == MAX_EXECUTION_TIME_EXCEEDED:
+            return GatewayTimeout(
+                description="The query took too long. Narrow the filters and try again.")
+        if code == QUERY_INTERRUPTED:
+            # Cancelled because the client left; nobody reads this
+            return ServiceUnavailable(description="The query was cancelled.")
+        raise error
+
+    @app.errorhandler(exc.TimeoutError)
+    def pool_exhausted(error):
+        # No database connection became free in time
+        response = ServiceUnavailable(
+            description="The server is busy. Try again shortly.").get_response()
+        response.headers["Retry-After"] = "1"
+        return response
@@ -0,0 +1,151 @@
+# Cache warming. Right after a worker starts, and again whenever a data-version
+# bump is noticed, it computes the stats the first users would otherwise wait
+# for: the default dashboard view, each of the busiest pickup zones on the
+# default day, and the filters asked for most in the query log. Warming runs on
+# WARMUP_CONCURRENCY background threads and goes through the same single-flight
+# and admission control as requests, so workers warming together share one
+# computation per spec and never push heavy queries past their slots. Each
+# spec runs under the stats endpoint's time budget (timeouts.py).
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from sqlalchemy import exc
+from werkzeug.exceptions import HTTPException
+from db import db
+from dimensions import dimensions
+from filters import FilterSpec
+from routes.trips import trips_stats
+import admission
+import data_version
+import query_log
+import queries
+import timeouts
+
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 2))
+WARMUP_TOP_ZONES = int(os.getenv("WARMUP_TOP_ZONES", 10))
+WARMUP_POPULAR = int(os.getenv("WARMUP_POPULAR", 20))
+# How far back the query log counts towards popularity, in seconds
+WARMUP_WINDOW = int(os.getenv("WARMUP_WINDOW", 24 * 3600))
+
+
+def default_spec():
+    return FilterSpec.from_lists({})
+
+
+def zone_specs(spec, limit):
+    # The spec narrowed to each of its busiest pickup zones
+    rows = db.session.execute(*queries.zone_counts(spec)).all()
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [
+        FilterSpec.from_lists(dict(spec.to_args(), pickup_zone=[dimensions.zone_name(location_id)]))
+        for location_id, _ in rows[:limit]
+    ]
+
+
+def popular_specs(limit, window=WARMUP_WINDOW):
+    since = datetime.now().timestamp() - window
+    counts = Counter()
+    for entry in query_log.read(since):
+        if entry.get("status") != 200:
+            continue
+        try:
+            counts[query_log.spec_of(entry)] += 1
+        except HTTPException:
+            # Filters that no longer parse, e.g. a zone renamed since
+            continue
+    return [spec for spec, _ in counts.most_common(limit)]
+
+
+def targets():
+    default = default_spec()
+    specs = [default] + zone_specs(default, WARMUP_TOP_ZONES) + popular_specs(WARMUP_POPULAR)
+    # In order, without duplicates
+    return list(dict.fromkeys(specs))
+
+
+def affected(spec, months):
+    # Whether a spec's date range covers any of the months
+    first = date(spec.date_from.year, spec.date_from.month, 1) if spec.date_from else date.min
+    last = spec.date_to or date.max
+    return any(first <= month <= last for month in months)
+
+
+# No follow-up run requested
+_IDLE = object()
+
+
+class Warmer:
+    def __init__(self, concurrency=WARMUP_CONCURRENCY):
+        self.concurrency = concurrency
+        self.app = None
+        self._running = False
+        self._pending = _IDLE
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        # Call in each worker once it has its own connections (after fork)
+        self.app = app
+        data_version.on_change(self.schedule)
+        if WARMUP_ON_START:
+            self.schedule(None)
+
+    def schedule(self, months=None):
+        # months=None warms every target. Requests made while a run is going
+        # are merged into a single follow-up run.
+        with self._lock:
+            if self._running:
+                if self._pending is _IDLE:
+                    self._pending = None if months is None else set(months)
+                elif self._pending is not None:
+                    self._pending = None if months is None else self._pending | set(months)
+                return
+            self._running = True
+        threading.Thread(target=self._run, args=(months,), daemon=True,
+                         name="cache-warmup").start()
+
+    def _run(self, months):
+        while True:
+            try:
+                self.warm(months)
+            except Exception:
+                self.app.logger.exception("Cache warmup failed")
+            with self._lock:
+                if self._pending is _IDLE:
+                    self._running = False
+                    return
+                months, self._pending = self._pending, _IDLE
+
+    def warm(self, months=None):
+        with self.app.app_context():
+            dimensions.ensure_loaded()
+            db.session.info["read_only"] = True
+            specs = targets()
+        if months is not None:
+            specs = [spec for spec in specs if affected(spec, months)]
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            warmed = sum(pool.map(self.warm_spec, specs))
+        self.app.logger.info("Cache warmup: %d of %d filter sets", warmed, len(specs))
+
+    def warm_spec(self, spec):
+        with self.app.app_context():
+            db.session.info["read_only"] = True
+            try:
+                connection = db.session.connection()
+                # Same limit as a stats request; the reset listener undoes it
+                # when the session returns the connection
+                timeouts.set_budget(connection, timeouts.BUDGETS["trips.get_trips_stats"])
+                version = data_version.for_spec(connection, spec)
+                trips_stats(spec, version)
+            except admission.Overloaded:
+                return False
+            except exc.SQLAlchemyError as error:
+                # One spec failing (e.g. over its time budget) doesn't stop the rest
+                self.app.logger.warning("Cache warmup of %r failed: %s", spec, error)
+                return False
+            return True
+
+
+warmer = Warmer()
@@ -0,0 +1,9 @@
+# Production entry point, used by gunicorn (see gunicorn.conf.py)
+import gc
+from main import create_app
+
+app = create_app(preload=True)
+
+# Move everything loaded so far out of the GC's reach, so collections in the
+# workers don't touch (and copy) the pages shared with the master
+gc.freeze()
@@ -1,29 +1,304 @@
+# Index advisor and manager for trips, driven by the API's query log
+# (backend/api/query_log.py writes data/query_log.ndjson).
+#
+#   python create_indexes.py list                      # indexes on trips
+#   python create_indexes.py advise                    # proposals and unused indexes
+#   python create_indexes.py apply                     # create the proposed indexes
+#   python create_indexes.py apply --drop-unused       # ... and drop the unused ones
+#
+# Every logged request contributes its filter shape (which filters it used),
+# weighted by its duration. For each shape with at least --min-share of the
+# logged time, the proposal is a composite index with the zone filters
+# (IN lists, so equality-like) first, then the pickup time range, followed by
+# the columns the stats queries aggregate so those scans read the index alone.
+# Proposals that are a prefix of another one, or of an existing index, are
+# dropped. An existing index is reported unused when no logged shape filters
+# on its first column and, where performance_schema has the numbers, it hasn't
+# been read since the server started.
+#
+# Changes run as online DDL (ALGORITHM=INPLACE, LOCK=NONE) so the API keeps
+# reading and writing; applying again skips what already exists.
+
+import argparse
+import json
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-import urllib.parse
-
-load_dotenv('/Users/princemukunzi/Documents/ALU/Urban_Mobility_Data_Explorer_G8/backend/api/.env')
-user = os.getenv('DB_USER')
-password = os.getenv('DB_PASSWORD')
-database = os.getenv('DB_NAME')
-host = os.getenv('DB_HOST')
-port = os.getenv('DB_PORT')
-
-safe_password = urllib.parse.quote_plus(password)
-engine = create_engine(f'mysql+pymysql://{user}:{safe_password}@{host}:{port}/{database}')
-
-queries = [
-    "CREATE INDEX idx_tpep_pickup_datetime ON trips (tpep_pickup_datetime);",
-    "CREATE INDEX idx_PULocationID ON trips (PULocationID);",
-    "CREATE INDEX idx_DOLocationID ON trips (DOLocationID);"
-]
-
-with engine.connect() as conn:
-    for q in queries:
-        print(f"Executing: {q}")
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import text
+from db_engine import get_engine
+
+TABLE = "trips"
+QUERY_LOG = os.getenv("QUERY_LOG", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "query_log.ndjson"))
+
+# Filter -> (column, how it is compared). The hour filters compare HOUR(col),
+# which no plain index can serve.
+FILTER_COLUMNS = {
+    "pickup_zone": ("PULocationID", "in"),
+    "pickup_borough": ("PULocationID", "in"),
+    "dropoff_zone": ("DOLocationID", "in"),
+    "dropoff_borough": ("DOLocationID", "in"),
+    "date_from": ("tpep_pickup_datetime", "range"),
+    "date_to": ("tpep_pickup_datetime", "range"),
+    "min_passengers": ("passenger_count", "range"),
+    "max_passengers": ("passenger_count", "range"),
+    "min_distance": ("trip_distance", "range"),
+    "max_distance": ("trip_distance", "range"),
+    "min_fare": ("fare_amount", "range"),
+    "max_fare": ("fare_amount", "range"),
+    "min_duration": ("duration_seconds", "range"),
+    "max_duration": ("duration_seconds", "range"),
+}
+# Only one range can narrow an index scan; pickup time is the one every
+# dashboard request has
+RANGE_PRIORITY = ["tpep_pickup_datetime", "duration_seconds", "fare_amount", "trip_distance",
+                  "passenger_count"]
+IN_ORDER = ["PULocationID", "DOLocationID"]
+# Read by the stats queries (totals, busiest zone, peak hour) and the range filters
+STATS_COLUMNS = ["PULocationID", "tpep_pickup_datetime", "fare_amount", "trip_distance",
+                 "tip_pct", "duration_seconds", "mph", "passenger_count"]
+SHORT_NAMES = {
+    "PULocationID": "pu",
+    "DOLocationID": "do",
+    "tpep_pickup_datetime": "pickup",
+    "passenger_count": "passengers",
+    "trip_distance": "distance",
+    "fare_amount": "fare",
+    "duration_seconds": "duration",
+}
+
+# Seconds between progress reports while an ALTER runs
+PROGRESS_INTERVAL = 5
+
+
+def read_log(paths, since=None):
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since is None or entry.get("ts", 0) >= since:
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def workload(entries):
+    # {shape: {"requests": n, "ms": total}}, shape being a sorted tuple of filters
+    shapes = defaultdict(lambda: {"requests": 0, "ms": 0.0})
+    for entry in entries:
+        shape = tuple(sorted(entry.get("filters", {})))
+        shapes[shape]["requests"] += 1
+        shapes[shape]["ms"] += entry.get("ms", 0)
+    return dict(shapes)
+
+
+def index_for(shape, covering=True):
+    # (columns, how many of them the filters seek on) for a filter shape; the
+    # stats columns follow the key when covering
+    columns = {FILTER_COLUMNS[name] for name in shape if name in FILTER_COLUMNS}
+    equality = [c for c in IN_ORDER if (c, "in") in columns]
+    ranges = [c for c in RANGE_PRIORITY if (c, "range") in columns]
+    key = equality + ranges[:1]
+    if not key:
+        return None
+    columns = list(key)
+    if covering:
+        # Includes the other range columns, so those filters are checked from
+        # the index too
+        columns += [c for c in STATS_COLUMNS if c not in key]
+    return tuple(columns), len(key)
+
+
+def index_name(columns, key_length):
+    name = "idx_trips_" + "_".join(SHORT_NAMES.get(c, c.lower()) for c in columns[:key_length])
+    return name + "_cover" if len(columns) > key_length else name
+
+
+def existing_indexes(conn):
+    # {name: (columns in order)}
+    rows = conn.execute(text("""
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """), {"table": TABLE}).all()
+    indexes = defaultdict(list)
+    for name, column in rows:
+        indexes[name].append(column)
+    return {name: tuple(columns) for name, columns in indexes.items()}
+
+
+def foreign_key_columns(conn):
+    return {row[0] for row in conn.execute(text("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+          AND REFERENCED_TABLE_NAME IS NOT NULL
+    """), {"table": TABLE})}
+
+
+def never_read(conn):
+    # Indexes performance_schema saw no reads of since startup, or None when
+    # the sys schema isn't available
+    try:
+        return {row[0] for row in conn.execute(text("""
+            SELECT index_name FROM sys.schema_unused_indexes
+            WHERE object_schema = DATABASE() AND object_name = :table
+        """), {"table": TABLE})}
+    except Exception:
+        return None
+
+
+def advise(conn, shapes, min_share=0.01, covering=True):
+    # Returns (proposals {name: columns}, unused index names, report lines)
+    existing = existing_indexes(conn)
+    total_ms = sum(s["ms"] for s in shapes.values()) or 1
+    report = []
+
+    candidates = {}
+    for shape, stats in sorted(shapes.items(), key=lambda item: -item[1]["ms"]):
+        share = stats["ms"] / total_ms
+        if share < min_share:
+            continue
+        report.append(f"{share:6.1%}  {stats['requests']:>7} requests  "
+                      f"{', '.join(shape) or '(no filters)'}")
+        index = index_for(shape, covering)
+        if index is not None:
+            candidates[index[0]] = index[1]
+
+    # An index also serves every query a prefix of it would
+    proposals = {}
+    for columns in sorted(candidates, key=len, reverse=True):
+        if any(other[:len(columns)] == columns for other in proposals.values()):
+            continue
+        served_by = [name for name, other in existing.items() if other[:len(columns)] == columns]
+        if served_by:
+            report.append(f"already served by {served_by[0]}: ({', '.join(columns)})")
+            continue
+        proposals[index_name(columns, candidates[columns])] = columns
+
+    leading = {FILTER_COLUMNS[name][0] for shape in shapes for name in shape
+               if name in FILTER_COLUMNS}
+    unread = never_read(conn)
+    fk_columns = foreign_key_columns(conn)
+    unused = []
+    for name, columns in sorted(existing.items()):
+        if name == "PRIMARY" or columns[0] in leading:
+            continue
+        if unread is not None and name not in unread:
+            continue
+        # InnoDB needs an index led by each foreign key column; one already
+        # marked unused doesn't count
+        if columns[0] in fk_columns and not any(
+                other[0] == columns[0] for other_name, other in existing.items()
+                if other_name != name and other_name not in unused):
+            continue
+        unused.append(name)
+    return proposals, unused, report
+
+
+def _watch_progress(engine, done):
+    # InnoDB reports ALTER progress as stage events when the
+    # stage/innodb/alter% instruments are enabled
+    query = text("""
+        SELECT EVENT_NAME, WORK_COMPLETED, WORK_ESTIMATED
+        FROM performance_schema.events_stages_current
+        WHERE EVENT_NAME LIKE 'stage/innodb/alter%'
+    """)
+    started = time.monotonic()
+    while not done.wait(PROGRESS_INTERVAL):
+        line = f"  {time.monotonic() - started:.0f}s"
         try:
-            conn.execute(text(q))
-            print("Successfully executed.")
-        except Exception as e:
-            print(f"Error executing {q}: {e}")
+            with engine.connect() as conn:
+                row = conn.execute(query).first()
+            if row is not None and row[2]:
+                line += f", {row[0].rsplit('/', 1)[-1]} {100 * row[1] / row[2]:.0f}%"
+        except Exception:
+            pass
+        print(line)
+
+
+def online_ddl(engine, statement):
+    print(statement)
+    done = threading.Event()
+    watcher = threading.Thread(target=_watch_progress, args=(engine, done), daemon=True)
+    watcher.start()
+    started = time.monotonic()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(statement + ", ALGORITHM=INPLACE, LOCK=NONE"))
+    finally:
+        done.set()
+        watcher.join()
+    print(f"  done in {time.monotonic() - started:.1f}s")
+
+
+def apply(engine, proposals, unused, drop_unused=False):
+    with engine.connect() as conn:
+        existing = existing_indexes(conn)
+    by_columns = {columns: name for name, columns in existing.items()}
+    for name, columns in proposals.items():
+        if columns in by_columns:
+            print(f"Skipping {name}: {by_columns[columns]} has the same columns")
+            continue
+        if name in existing:
+            print(f"Skipping {name}: an index of that name has other columns")
+            continue
+        online_ddl(engine, f"ALTER TABLE {TABLE} ADD INDEX {name} ({', '.join(columns)})")
+    if drop_unused:
+        for name in unused:
+            if name in existing:
+                online_ddl(engine, f"ALTER TABLE {TABLE} DROP INDEX {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Workload-driven indexes for trips")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    for command in ("advise", "apply"):
+        p = sub.add_parser(command)
+        p.add_argument("--log", nargs="+", default=[QUERY_LOG + ".1", QUERY_LOG],
+                       help="query log files (default: the API's log and its rotation)")
+        p.add_argument("--days", type=float, help="only the last N days of the log")
+        p.add_argument("--min-share", type=float, default=0.01,
+                       help="smallest share of logged query time worth an index")
+        p.add_argument("--no-cover", dest="covering", action="store_false",
+                       help="key columns only, without the stats columns")
+        if command == "apply":
+            p.add_argument("--drop-unused", action="store_true")
+    args = parser.parse_args()
+
+    engine = get_engine(isolation_level="AUTOCOMMIT")
+    if args.command == "list":
+        with engine.connect() as conn:
+            for name, columns in sorted(existing_indexes(conn).items()):
+                print(f"{name}: {', '.join(columns)}")
+        return
+
+    since = time.time() - args.days * 86400 if args.days else None
+    shapes = workload(read_log(args.log, since))
+    if not shapes:
+        raise SystemExit(f"No queries logged in {', '.join(args.log)}")
+    with engine.connect() as conn:
+        proposals, unused, report = advise(conn, shapes, args.min_share, args.covering)
+
+    print(f"Workload ({sum(s['requests'] for s in shapes.values())} requests):")
+    for line in report:
+        print("  " + line)
+    print("Proposed:" if proposals else "Nothing to add.")
+    for name, columns in proposals.items():
+        print(f"  {name} ({', '.join(columns)})")
+    print("Unused:" if unused else "No unused indexes.")
+    for name in unused:
+        print(f"  {name}")
+
+    if args.command == "apply":
+        apply(engine, proposals, unused, args.drop_unused)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Bumps the data_version of the months a job changed, so the API drops cached
+# results and ETags for those months (backend/api/data_version.py).
+#
+#   python data_version.py bump 2019-01 2019-02
+#   python data_version.py list
+#
+# Every bump takes the next value of one counter shared by all months, so the
+# newest version among a range of months identifies the state of the range.
+
+import argparse
+from datetime import date
+from sqlalchemy import text
+from db_engine import get_engine
+
+
+def parse_month(value):
+    if isinstance(value, date):
+        return date(value.year, value.month, 1)
+    return date(int(str(value)[:4]), int(str(value)[5:7]), 1)
+
+
+def bump(engine, months):
+    months = sorted({parse_month(m) for m in months})
+    if not months:
+        return None
+    # Its own transaction (the maintenance scripts use autocommit engines), so
+    # FOR UPDATE keeps concurrent jobs from taking the same version
+    with engine.execution_options(isolation_level="REPEATABLE READ").begin() as conn:
+        version = conn.execute(text(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM data_version FOR UPDATE"
+        )).scalar()
+        conn.execute(text("""
+            INSERT INTO data_version (month, version) VALUES (:month, :version)
+            ON DUPLICATE KEY UPDATE version = :version
+        """), [{"month": month, "version": version} for month in months])
+    print(f"data_version {version}: {', '.join(f'{m:%Y-%m}' for m in months)}")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-month data versions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("bump")
+    p.add_argument("months", nargs="+", help="YYYY-MM")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "bump":
+        bump(engine, args.months)
+    elif args.command == "list":
+        with engine.connect() as conn:
+            for month, version, updated_at in conn.execute(text(
+                    "SELECT month, version, updated_at FROM data_version ORDER BY month")):
+                print(f"{month:%Y-%m}  {version}  {updated_at}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# Dataset profile of trips: row count, and per column min, max, null count and
+# a histogram, plus trip counts per vendor and payment type. Ingest builds it
+# from the chunks it loads and merges it into the stored profile; the API serves
+# it from memory at /api/meta, so nobody needs a full-table MIN/MAX again.
+#
+#   python dataset_profile.py rebuild    # recompute from the whole table
+#   python dataset_profile.py show
+#
+# Histograms use fixed bin edges so profiles of different loads add up. Rows
+# deleted later (maintenance.py, partitioning.py drop) aren't subtracted; run
+# rebuild after large deletes.
+
+import argparse
+import json
+import math
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import text
+from db_engine import get_engine
+
+PROFILE_NAME = "trips"
+CHUNK_ROWS = 100000
+
+# Upper bin edges; the last bin is open-ended
+NUMERIC_BINS = {
+    "passenger_count": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+    "trip_distance": [1, 2, 3, 5, 10, 20, 30, 50, 100],
+    "fare_amount": [5, 10, 15, 20, 30, 50, 75, 100, 200, 500],
+    "tip_amount": [1, 2, 5, 10, 20, 50, 100],
+    "total_amount": [5, 10, 15, 20, 30, 50, 75, 100, 200, 500],
+    "duration_seconds": [300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200],
+    "mph": [5, 10, 15, 20, 30, 40, 60],
+    "tip_pct": [5, 10, 15, 20, 25, 30, 50, 100],
+}
+DATETIME_COLUMNS = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+VALUE_COLUMNS = ["VendorID", "payment_type"]
+
+
+def _min(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+class Profile:
+    def __init__(self, data=None):
+        self.data = data or {"rows": 0, "columns": {}, "values": {}}
+
+    def _column(self, name, bins):
+        return self.data["columns"].setdefault(name, {
+            "min": None, "max": None, "nulls": 0,
+            "histogram": {"edges": bins, "counts": [0] * (len(bins) + 1)},
+        })
+
+    def add(self, df):
+        # Accumulates a chunk of trips with parsed datetimes and numeric columns
+        self.data["rows"] += len(df)
+        for name, bins in NUMERIC_BINS.items():
+            if name not in df:
+                continue
+            values = pd.to_numeric(df[name], errors="coerce")
+            present = values.dropna()
+            column = self._column(name, bins)
+            column["nulls"] += int(values.isna().sum())
+            if present.empty:
+                continue
+            column["min"] = _min(column["min"], float(present.min()))
+            column["max"] = _max(column["max"], float(present.max()))
+            # Bin i holds values below edges[i] (and from edges[i-1] up)
+            index = pd.Series(pd.Index(bins).searchsorted(present.to_numpy(), side="right"))
+            for i, count in index.value_counts().items():
+                column["histogram"]["counts"][int(i)] += int(count)
+
+        for name in DATETIME_COLUMNS:
+            if name not in df:
+                continue
+            values = pd.to_datetime(df[name], errors="coerce")
+            present = values.dropna()
+            column = self.data["columns"].setdefault(name, {
+                "min": None, "max": None, "nulls": 0, "months": {}})
+            column["nulls"] += int(values.isna().sum())
+            if present.empty:
+                continue
+            column["min"] = _min(column["min"], present.min().isoformat())
+            column["max"] = _max(column["max"], present.max().isoformat())
+            for month, count in present.dt.strftime("%Y-%m").value_counts().items():
+                column["months"][month] = column["months"].get(month, 0) + int(count)
+
+        for name in VALUE_COLUMNS:
+            if name not in df:
+                continue
+            counts = self.data["values"].setdefault(name, {})
+            for value, count in df[name].dropna().astype(int).value_counts().items():
+                counts[str(value)] = counts.get(str(value), 0) + int(count)
+
+    def merge(self, other):
+        # Adds another profile, e.g. the stored one, into this one
+        self.data["rows"] += other.data["rows"]
+        for name, theirs in other.data["columns"].items():
+            ours = self.data["columns"].get(name)
+            if ours is None:
+                self.data["columns"][name] = json.loads(json.dumps(theirs))
+                continue
+            ours["min"] = _min(ours["min"], theirs["min"])
+            ours["max"] = _max(ours["max"], theirs["max"])
+            ours["nulls"] += theirs["nulls"]
+            # Counts from bins that have since changed can't be added; rebuild
+            if "histogram" in ours and ours["histogram"]["edges"] == theirs["histogram"]["edges"]:
+                ours["histogram"]["counts"] = [
+                    a + b for a, b in zip(ours["histogram"]["counts"], theirs["histogram"]["counts"])]
+            if "months" in ours:
+                for month, count in theirs["months"].items():
+                    ours["months"][month] = ours["months"].get(month, 0) + count
+        for name, theirs in other.data["values"].items():
+            ours = self.data["values"].setdefault(name, {})
+            for value, count in theirs.items():
+                ours[value] = ours.get(value, 0) + count
+        return self
+
+
+def quantile(column, q):
+    # Upper edge of the bin where the cumulative count reaches q; the column's
+    # max when that is the open-ended last bin
+    histogram = column.get("histogram")
+    if not histogram:
+        return None
+    total = sum(histogram["counts"])
+    if not total:
+        return None
+    running = 0
+    for edge, count in zip(histogram["edges"] + [math.inf], histogram["counts"]):
+        running += count
+        if running >= q * total:
+            return column["max"] if edge == math.inf else min(edge, column["max"])
+    return column["max"]
+
+
+def load(engine, name=PROFILE_NAME):
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT profile FROM dataset_profile WHERE name = :name"), {"name": name}).first()
+    if row is None:
+        return None
+    return Profile(json.loads(row[0]) if isinstance(row[0], str) else row[0])
+
+
+def save(engine, profile, name=PROFILE_NAME, merge=True):
+    # merge=True adds the stored profile (earlier loads) to this one first
+    if merge:
+        stored = load(engine, name)
+        if stored is not None:
+            profile.merge(stored)
+    # Upper bounds for UI sliders that a few outliers don't stretch
+    for column in profile.data["columns"].values():
+        if "histogram" in column:
+            column["p99"] = quantile(column, 0.99)
+    profile.data["generated_at"] = datetime.now().isoformat(timespec="seconds")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO dataset_profile (name, profile) VALUES (:name, :profile)
+            ON DUPLICATE KEY UPDATE profile = VALUES(profile)
+        """), {"name": name, "profile": json.dumps(profile.data)})
+    print(f"Saved dataset profile '{name}': {profile.data['rows']} rows")
+    return profile
+
+
+def rebuild(engine):
+    # One streamed pass over trips, off the request path
+    columns = list(NUMERIC_BINS) + DATETIME_COLUMNS + VALUE_COLUMNS
+    profile = Profile()
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql(text(f"SELECT {', '.join(columns)} FROM trips"),
+                                 conn, chunksize=CHUNK_ROWS):
+            profile.add(chunk)
+            print(f"Profiled {profile.data['rows']} rows")
+    return save(engine, profile, merge=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset profile of trips")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild")
+    sub.add_parser("show")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "rebuild":
+        rebuild(engine)
+    elif args.command == "show":
+        profile = load(engine)
+        print(json.dumps(profile.data if profile else None, indent=2))
+
+
+if __name__ == "__main__":
+    main()
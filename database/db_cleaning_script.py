@@ -4,6 +4,11 @@ import numpy as np
 import os
 import urllib.parse
 from dotenv import load_dotenv
+from partitioning import ensure_partitions
+from data_version import bump
+from validation import Validator
+from dataset_profile import Profile, save as save_profile
+from derived import derive
 
 load_dotenv('../backend/api/.env')
 
@@ -30,92 +35,12 @@ except Exception as e:
     print("Database connection failed:", e)
     exit()
 
-# -----------------------------
-# LOADING THE DATA
-# -----------------------------
-
-trips_df = pd.read_csv("yellow_tripdata_2019-01.csv")
-print(f"Loaded {len(trips_df)} rows")
-
-# -----------------------------
-# CLEANING THE TRIPS DATA
-# -----------------------------
-
-trips_df["tpep_pickup_datetime"] = pd.to_datetime(
-    trips_df["tpep_pickup_datetime"], errors="coerce"
-)
-trips_df["tpep_dropoff_datetime"] = pd.to_datetime(
-    trips_df["tpep_dropoff_datetime"], errors="coerce"
-)
-
-trips_df = trips_df[
-    (trips_df["trip_distance"] > 0) &
-    (trips_df["fare_amount"] > 0)
-]
-
-text_columns = ["store_and_fwd_flag"]
-trips_df[text_columns] = trips_df[text_columns].fillna("Unknown")
-
-numeric_columns = [
-    "fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount",
-    "improvement_surcharge", "total_amount", "congestion_surcharge", "trip_distance"
-]
-
-for col in numeric_columns:
-    trips_df[col] = pd.to_numeric(trips_df[col], errors="coerce")
-
-trips_df = trips_df.where(pd.notnull(trips_df), None)
-
-# Drop rows where VendorID is null
-trips_df = trips_df.dropna(subset=["VendorID"])
-trips_df["VendorID"] = trips_df["VendorID"].astype(int)
-
-print(f"After cleaning: {len(trips_df)} rows")
-
-# -----------------------------
-# SEED VENDORS TABLE
-# -----------------------------
-
-vendor_map = {
-    1: "Creative Mobile Technologies, LLC",
-    2: "VeriFone Inc."
-}
-
-unique_vendor_ids = sorted(trips_df["VendorID"].unique().tolist())
-
-vendors_df = pd.DataFrame([
-    {
-        "VendorID": vid,
-        "vendor_name": vendor_map.get(vid, f"Unknown Vendor {vid}")
-    }
-    for vid in unique_vendor_ids
-])
-
-print(f"Upserting {len(vendors_df)} vendors: {unique_vendor_ids}")
-
-with engine.connect() as conn:
-    for _, row in vendors_df.iterrows():
-        conn.execute(text(
-            "INSERT IGNORE INTO vendors (VendorID, vendor_name) VALUES (:vid, :name)"
-        ), {"vid": int(row["VendorID"]), "name": row["vendor_name"]})
-    conn.commit()
-
-print("Vendors seeded successfully!")
-
 # -----------------------------
 # SEED LOCATIONS TABLE
 # -----------------------------
 
 zones_df = pd.read_csv("taxi_zone_lookup.csv")
 
-# Rename columns to match your DB table columns
-zones_df = zones_df.rename(columns={
-    "LocationID": "LocationID",
-    "Borough":    "Borough",
-    "Zone":       "Zone",
-    "service_zone": "service_zone"
-})
-
 # Clean: fill any nulls in text fields
 zones_df["Borough"]      = zones_df["Borough"].fillna("Unknown")
 zones_df["Zone"]         = zones_df["Zone"].fillna("Unknown")
@@ -140,27 +65,85 @@ with engine.connect() as conn:
 print("Locations seeded successfully!")
 
 # -----------------------------
-# LOAD TRIPS TO DATABASE
+# LOAD TRIPS, CHUNK BY CHUNK
 # -----------------------------
 
-# Safety filter: only insert trips whose LocationIDs exist in the locations table
-valid_location_ids = zones_df["LocationID"].tolist()
-valid_vendor_ids   = vendors_df["VendorID"].tolist()
+SOURCE = "yellow_tripdata_2019-01.csv"
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 100000))
 
-before = len(trips_df)
-trips_df = trips_df[
-    trips_df["VendorID"].isin(valid_vendor_ids) &
-    trips_df["PULocationID"].isin(valid_location_ids) &
-    trips_df["DOLocationID"].isin(valid_location_ids)
+vendor_map = {
+    1: "Creative Mobile Technologies, LLC",
+    2: "VeriFone Inc."
+}
+
+text_columns = ["store_and_fwd_flag"]
+numeric_columns = [
+    "passenger_count", "fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount",
+    "improvement_surcharge", "total_amount", "congestion_surcharge", "trip_distance"
 ]
-print(f"Trips after FK safety filter: {len(trips_df)} (dropped {before - len(trips_df)})")
-
-trips_df.to_sql(
-    name="trips",
-    con=engine,
-    if_exists="append",
-    index=False,
-    chunksize=5000
-)
 
-print("Data successfully inserted into database!")
\ No newline at end of file
+# Rows failing a rule in validation.py go to data/quarantine/ instead of trips
+validator = Validator(SOURCE, {"location_ids": set(zones_df["LocationID"])})
+profile = Profile()
+seen_vendors = set()
+loaded_months = set()
+total = 0
+
+for trips_df in pd.read_csv(SOURCE, chunksize=CHUNK_ROWS):
+    total += len(trips_df)
+
+    trips_df["tpep_pickup_datetime"] = pd.to_datetime(
+        trips_df["tpep_pickup_datetime"], errors="coerce"
+    )
+    trips_df["tpep_dropoff_datetime"] = pd.to_datetime(
+        trips_df["tpep_dropoff_datetime"], errors="coerce"
+    )
+    for col in numeric_columns:
+        trips_df[col] = pd.to_numeric(trips_df[col], errors="coerce")
+
+    trips_df = validator.apply(trips_df)
+    if trips_df.empty:
+        continue
+
+    months = set(trips_df["tpep_pickup_datetime"].dt.strftime("%Y-%m").unique())
+    # Duration, speed and tip percentage, stored so queries don't recompute them
+    trips_df = derive(trips_df)
+    profile.add(trips_df)
+    trips_df[text_columns] = trips_df[text_columns].fillna("Unknown")
+    trips_df["VendorID"] = trips_df["VendorID"].astype(int)
+    trips_df = trips_df.where(pd.notnull(trips_df), None)
+
+    # Vendors are seeded as they first appear, ahead of the trips referencing them
+    new_vendors = sorted(set(trips_df["VendorID"].unique().tolist()) - seen_vendors)
+    if new_vendors:
+        print(f"Upserting vendors: {new_vendors}")
+        with engine.connect() as conn:
+            for vid in new_vendors:
+                conn.execute(text(
+                    "INSERT IGNORE INTO vendors (VendorID, vendor_name) VALUES (:vid, :name)"
+                ), {"vid": int(vid), "name": vendor_map.get(vid, f"Unknown Vendor {vid}")})
+            conn.commit()
+        seen_vendors.update(new_vendors)
+
+    # Make sure every month being loaded has its own partition (no-op if trips isn't partitioned)
+    if months - loaded_months:
+        ensure_partitions(engine, months | loaded_months)
+        loaded_months |= months
+
+    trips_df.to_sql(
+        name="trips",
+        con=engine,
+        if_exists="append",
+        index=False,
+        chunksize=5000
+    )
+    print(f"Read {total} rows, inserted {validator.accepted}")
+
+validator.report()
+# Ranges and histograms for /api/meta, added to those of earlier loads
+save_profile(engine, profile)
+
+# Tell the API which months changed, so it stops serving cached results for them
+bump(engine, loaded_months)
+
+print("Data successfully inserted into database!")
@@ -129,6 +129,16 @@ create table trips
     congestion_surcharge decimal(10,2) default 0.00 null
         comment 'Congestion pricing surcharge applied in certain NYC zones',
 
+    -- Derived at ingest (database/derived.py)
+    duration_seconds int null
+        comment 'Seconds from pickup to dropoff',
+
+    mph double null
+        comment 'Average speed in miles per hour, null without a positive duration',
+
+    tip_pct double null
+        comment 'Tip as a percentage of fare_amount, null when the fare is 0',
+
     constraint fk_trips_vendor
         foreign key (VendorID)
         references vendors (VendorID),
@@ -155,19 +165,56 @@ comment='Table containing individual NYC taxi trip records';
 
 
 
+-- DATA VERSION
+-- One row per month of trips, bumped by every job that changes that month
+-- (database/data_version.py). The API keys its caches and ETags on it.
+create table data_version
+(
+    month date not null primary key
+        comment 'First day of the month of tpep_pickup_datetime',
+
+    version bigint not null
+        comment 'Value of a global counter at the last change to the month',
+
+    updated_at timestamp default current_timestamp not null on update current_timestamp
+        comment 'When the month last changed'
+)
+comment='Per-month data version used for cache invalidation';
+
+
+
+-- DATASET PROFILE
+-- Column ranges, null counts and histograms of trips, built by ingest
+-- (database/dataset_profile.py) and served by the API at /api/meta
+create table dataset_profile
+(
+    name varchar(50) not null primary key,
+
+    profile json not null,
+
+    updated_at timestamp default current_timestamp not null on update current_timestamp
+)
+comment='Precomputed profile of a table, for UI bounds and planning';
+
+
+
 -- TRIPS INDEXES
+-- Only single-column starting points: composite indexes for the filters the API
+-- actually receives come from database/create_indexes.py, which reads the query
+-- log. No route filters on tpep_dropoff_datetime or total_amount (the dropoff
+-- hour filter is HOUR(col), which no index serves), so neither is indexed.
 create index idx_trips_pickup_datetime
     on trips (tpep_pickup_datetime);
 
-create index idx_trips_dropoff_datetime
-    on trips (tpep_dropoff_datetime);
-
 create index idx_trips_pickup_location
     on trips (PULocationID);
 
 create index idx_trips_dropoff_location
     on trips (DOLocationID);
 
+create index idx_trips_duration
+    on trips (duration_seconds);
+
 create index idx_trips_payment_type
     on trips (payment_type);
 
@@ -176,6 +223,3 @@ create index idx_trips_ratecode
 
 create index idx_trips_vendor
     on trips (VendorID);
-
-create index idx_trips_total_amount
-    on trips (total_amount);
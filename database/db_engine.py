@@ -0,0 +1,24 @@
+# Shared SQLAlchemy engine for the database maintenance scripts
+import os
+import urllib.parse
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+# Same .env as the API (backend/api/.env), falling back to one in the working directory
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', 'backend', 'api', '.env'))
+load_dotenv()
+
+
+def get_engine(**options):
+    user = os.getenv("DB_USER")
+    password = os.getenv("DB_PASSWORD")
+    database = os.getenv("DB_NAME")
+    host = os.getenv("DB_HOST")
+    port = os.getenv("DB_PORT")
+
+    safe_password = urllib.parse.quote_plus(password or "")
+    return create_engine(
+        f"mysql+pymysql://{user}:{safe_password}@{host}:{port}/{database}",
+        **options
+    )
@@ -1,4 +1,6 @@
 -- These are extra queries we ran in order to further clean the database tables
+-- The DELETEs below are kept for reference only: db_cleaning_script.py now rejects
+-- these rows at load time (see validation.py), so they never reach trips.
 
 
 SELECT * FROM trips LIMIT 100;
@@ -0,0 +1,61 @@
+# Columns of trips derived from the others: trip duration, average speed and
+# tip percentage. Ingest computes them for each chunk before inserting it, so
+# the API filters and averages them like any stored column instead of
+# recomputing them per row on every request.
+#
+# Rows loaded before these columns existed are filled in by
+# `python maintenance.py backfill-derived`, which also adds the columns.
+
+from sqlalchemy import text
+
+TABLE = "trips"
+
+# name -> column definition, in table order
+COLUMNS = {
+    "duration_seconds": "int null comment 'Seconds from pickup to dropoff'",
+    "mph": "double null comment 'Average speed in miles per hour, null without a positive duration'",
+    "tip_pct": "double null comment 'Tip as a percentage of fare_amount, null when the fare is 0'",
+}
+INDEXES = {
+    "idx_trips_duration": "duration_seconds",
+}
+
+# The same values in SQL, for rows already in the table
+_DURATION = "TIMESTAMPDIFF(SECOND, tpep_pickup_datetime, tpep_dropoff_datetime)"
+SQL = {
+    "duration_seconds": _DURATION,
+    "mph": f"CASE WHEN {_DURATION} > 0 THEN trip_distance * 3600 / {_DURATION} END",
+    "tip_pct": "100 * tip_amount / NULLIF(fare_amount, 0)",
+}
+
+
+def derive(df):
+    # Adds the columns to a chunk with parsed datetimes and numeric amounts
+    seconds = (df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]).dt.total_seconds()
+    df["duration_seconds"] = seconds.round().astype("Int64")
+    df["mph"] = df["trip_distance"] * 3600 / seconds.where(seconds > 0)
+    df["tip_pct"] = 100 * df["tip_amount"] / df["fare_amount"].where(df["fare_amount"] != 0)
+    return df
+
+
+def ensure_columns(engine):
+    # Adds whichever columns and indexes are missing; ADD COLUMN is instant on
+    # MySQL 8, the index is built online
+    with engine.connect() as conn:
+        present = set(conn.execute(text("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+        """), {"table": TABLE}).scalars())
+        indexes = set(conn.execute(text("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+        """), {"table": TABLE}).scalars())
+        for name, definition in COLUMNS.items():
+            if name not in present:
+                print(f"Adding column {name}")
+                conn.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN {name} {definition}"))
+        for name, column in INDEXES.items():
+            if name not in indexes:
+                print(f"Adding index {name}")
+                conn.execute(text(
+                    f"ALTER TABLE {TABLE} ADD INDEX {name} ({column}), ALGORITHM=INPLACE, LOCK=NONE"))
@@ -0,0 +1,289 @@
+# Cleanup of rows already in trips, safe to run while the API serves traffic.
+#
+#   python maintenance.py delete --where "YEAR(tpep_pickup_datetime) = 2088"
+#   python maintenance.py delete --where "passenger_count = 0 OR trip_distance = 0" --batch 2000
+#   python maintenance.py delete --where "..." --dry-run     # show the SQL and count
+#   python maintenance.py backfill-derived                   # derived.py columns for old rows
+#
+# Instead of one DELETE over the whole table (one long transaction, locks held
+# throughout, a huge undo log), rows are deleted in batches of --batch in
+# trip_id order, each batch its own short transaction. Function calls that
+# hide a column from its index, YEAR(col) and DATE(col) compared with a
+# constant, are rewritten into ranges on the column itself first.
+#
+# Between batches the job sleeps --pause seconds, and waits while a replica
+# from DB_REPLICA_HOSTS lags by more than --max-lag seconds or the primary has
+# more than --max-running threads running. The last deleted trip_id is
+# checkpointed under data/maintenance/ after every batch, so an interrupted job
+# started again with the same --where picks up where it stopped. The months
+# that lost rows get their data_version bumped at the end. backfill-derived
+# runs UPDATEs the same way.
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+from sqlalchemy import bindparam, create_engine, text
+from db_engine import get_engine
+import data_version
+import derived
+
+# Replica settings and the lag check are the API's (backend/api)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "backend", "api"))
+import config
+import replicas
+
+TABLE = "trips"
+CHECKPOINT_DIR = os.getenv("MAINTENANCE_CHECKPOINT_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "maintenance"))
+# Seconds between checks while throttled
+THROTTLE_SLEEP = 1.0
+
+_OPERATOR = r"\s*(=|<>|!=|<=|>=|<|>)\s*"
+_YEAR = re.compile(r"YEAR\(\s*(`?\w+`?)\s*\)" + _OPERATOR + r"'?(\d{4})'?", re.I)
+_DATE = re.compile(r"DATE\(\s*(`?\w+`?)\s*\)" + _OPERATOR + r"'(\d{4}-\d{2}-\d{2})'", re.I)
+
+
+def _range(column, operator, start, end):
+    # column <operator> [start, end) as conditions on the bare column
+    start, end = f"'{start} 00:00:00'", f"'{end} 00:00:00'"
+    return {
+        "=": f"({column} >= {start} AND {column} < {end})",
+        "<>": f"({column} < {start} OR {column} >= {end})",
+        "!=": f"({column} < {start} OR {column} >= {end})",
+        "<": f"{column} < {start}",
+        "<=": f"{column} < {end}",
+        ">": f"{column} >= {end}",
+        ">=": f"{column} >= {start}",
+    }[operator]
+
+
+def sargable(predicate):
+    def year(match):
+        column, operator, value = match.group(1), match.group(2), int(match.group(3))
+        return _range(column, operator, date(value, 1, 1), date(value + 1, 1, 1))
+
+    def day(match):
+        column, operator = match.group(1), match.group(2)
+        value = date.fromisoformat(match.group(3))
+        return _range(column, operator, value, date.fromordinal(value.toordinal() + 1))
+
+    return _DATE.sub(day, _YEAR.sub(year, predicate))
+
+
+def replica_lag(engine):
+    # replicas.replication_lag, and None when the replica can't be reached;
+    # replicas.LagUnknown goes to the caller
+    try:
+        with engine.connect() as conn:
+            return replicas.replication_lag(conn)
+    except replicas.LagUnknown:
+        raise
+    except Exception:
+        return None
+
+
+def replica_engines():
+    # The replicas the API reads from, with its connect timeout
+    return [create_engine(uri, **config.replica_engine_options())
+            for uri in config.replica_uris()]
+
+
+class Throttle:
+    def __init__(self, engine, replicas, max_lag, max_running, pause):
+        self.engine = engine
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.max_running = max_running
+        self.pause = pause
+
+    def reason(self):
+        # Why the next batch should wait, or None
+        for replica in self.replicas:
+            try:
+                lag = replica_lag(replica)
+            except replicas.LagUnknown as error:
+                # Not assumed to be caught up; grant REPLICATION CLIENT or
+                # leave the replica out of DB_REPLICA_HOSTS
+                return f"replica {replica.url.host} lag unknown ({error})"
+            if lag is None:
+                return f"replica {replica.url.host} not replicating"
+            if lag > self.max_lag:
+                return f"replica {replica.url.host} {lag}s behind"
+        if self.max_running:
+            with self.engine.connect() as conn:
+                running = int(conn.execute(text(
+                    "SHOW GLOBAL STATUS LIKE 'Threads_running'")).first()[1])
+            if running > self.max_running:
+                return f"{running} threads running"
+        return None
+
+    def wait(self):
+        time.sleep(self.pause)
+        while True:
+            reason = self.reason()
+            if reason is None:
+                return
+            print(f"Throttled: {reason}")
+            time.sleep(THROTTLE_SLEEP)
+
+
+class Checkpoint:
+    def __init__(self, where, sql, name=None, directory=CHECKPOINT_DIR):
+        name = name or hashlib.sha1(sql.encode("utf-8")).hexdigest()[:12]
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.json")
+        self.state = {"where": where, "sql": sql, "last_id": 0, "deleted": 0,
+                      "months": [], "finished": False}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved["sql"] != sql:
+                raise SystemExit(f"{self.path} belongs to another predicate: {saved['where']}")
+            self.state = saved
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _run_batches(engine, checkpoint, select_batch, apply_batch, batch, throttle, verb):
+    # Selects up to `batch` rows after the checkpointed trip_id, applies the
+    # change to them in one short transaction, and repeats until none are left.
+    # The checkpoint's "deleted" counts the rows changed, whatever the change.
+    state = checkpoint.state
+    months = set(state["months"])
+    started = time.monotonic()
+    changed_now = 0
+    try:
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(select_batch, {
+                    "last_id": state["last_id"], "batch": batch}).all()
+                if not rows:
+                    break
+                changed = conn.execute(apply_batch, {
+                    "ids": [row[0] for row in rows]}).rowcount
+
+            months.update(str(row[1])[:7] for row in rows)
+            changed_now += changed
+            state.update(last_id=rows[-1][0], deleted=state["deleted"] + changed,
+                         months=sorted(months))
+            checkpoint.save()
+            elapsed = time.monotonic() - started
+            print(f"{verb.capitalize()} {state['deleted']} rows through trip_id {state['last_id']} "
+                  f"({changed_now / elapsed:.0f} rows/s)")
+            throttle.wait()
+        state["finished"] = True
+        checkpoint.save()
+    finally:
+        # Even when interrupted, the API must stop serving the old rows
+        if months:
+            data_version.bump(engine, months)
+
+    elapsed = time.monotonic() - started
+    print(f"Done: {state['deleted']} rows {verb}, {changed_now} in {elapsed:.1f}s "
+          f"({changed_now / max(elapsed, 1e-9):.0f} rows/s)")
+    return state["deleted"]
+
+
+def _start(checkpoint, restart):
+    state = checkpoint.state
+    if restart or state["finished"]:
+        state.update(last_id=0, deleted=0, months=[], finished=False)
+    elif state["last_id"]:
+        print(f"Resuming after trip_id {state['last_id']} ({state['deleted']} done so far)")
+
+
+def batched_delete(engine, where, batch, throttle, name=None, restart=False):
+    sql = sargable(where)
+    checkpoint = Checkpoint(where, sql, name)
+    _start(checkpoint, restart)
+    print(f"Deleting from {TABLE} WHERE {sql}")
+
+    select_batch = text(
+        f"SELECT trip_id, tpep_pickup_datetime FROM {TABLE} "
+        f"WHERE trip_id > :last_id AND ({sql}) ORDER BY trip_id LIMIT :batch"
+    )
+    # The predicate is checked again, in case a row changed since it was selected
+    delete_batch = text(
+        f"DELETE FROM {TABLE} WHERE trip_id IN :ids AND ({sql})"
+    ).bindparams(bindparam("ids", expanding=True))
+    return _run_batches(engine, checkpoint, select_batch, delete_batch, batch, throttle,
+                        "deleted")
+
+
+def backfill_derived(engine, batch, throttle, restart=False):
+    # Fills in derived.COLUMNS for rows loaded before ingest computed them
+    derived.ensure_columns(engine)
+    where = "duration_seconds IS NULL"
+    assignments = ", ".join(f"{name} = {sql}" for name, sql in derived.SQL.items())
+    checkpoint = Checkpoint(where, assignments, "backfill-derived")
+    _start(checkpoint, restart)
+    print(f"Setting {', '.join(derived.SQL)} on {TABLE}")
+
+    select_batch = text(
+        f"SELECT trip_id, tpep_pickup_datetime FROM {TABLE} "
+        f"WHERE trip_id > :last_id AND {where} ORDER BY trip_id LIMIT :batch"
+    )
+    update_batch = text(
+        f"UPDATE {TABLE} SET {assignments} WHERE trip_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    return _run_batches(engine, checkpoint, select_batch, update_batch, batch, throttle,
+                        "updated")
+
+
+def dry_run(engine, where):
+    sql = sargable(where)
+    print(f"WHERE {sql}")
+    with engine.connect() as conn:
+        for row in conn.execute(text(
+                f"EXPLAIN SELECT trip_id FROM {TABLE} WHERE {sql} ORDER BY trip_id")).mappings():
+            print(f"  {row['table']}: type={row['type']} key={row['key']} rows={row['rows']}")
+        count = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE} WHERE {sql}")).scalar()
+    print(f"{count} rows match")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched maintenance on trips")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("delete")
+    p.add_argument("--where", required=True, help="SQL predicate on trips columns")
+    p.add_argument("--batch", type=int, default=5000, help="rows per batch")
+    p.add_argument("--pause", type=float, default=0.1, help="seconds between batches")
+    p.add_argument("--max-lag", type=float, default=5, help="max replica lag, seconds")
+    p.add_argument("--max-running", type=int, default=32,
+                   help="max Threads_running on the primary, 0 to ignore")
+    p.add_argument("--name", help="checkpoint name (default: a hash of the predicate)")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    p.add_argument("--dry-run", action="store_true", help="print the SQL and row count only")
+    p = sub.add_parser("backfill-derived", help="add and fill in the columns of derived.py")
+    p.add_argument("--batch", type=int, default=5000, help="rows per batch")
+    p.add_argument("--pause", type=float, default=0.1, help="seconds between batches")
+    p.add_argument("--max-lag", type=float, default=5, help="max replica lag, seconds")
+    p.add_argument("--max-running", type=int, default=32,
+                   help="max Threads_running on the primary, 0 to ignore")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    engine = get_engine(isolation_level="AUTOCOMMIT")
+    if args.command == "delete" and args.dry_run:
+        dry_run(engine, args.where)
+        return
+    throttle = Throttle(engine, replica_engines(), args.max_lag, args.max_running, args.pause)
+    if args.command == "delete":
+        batched_delete(engine, args.where, args.batch, throttle, args.name, args.restart)
+    elif args.command == "backfill-derived":
+        backfill_derived(engine, args.batch, throttle, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# Monthly range partitioning of the trips table on tpep_pickup_datetime.
+#
+#   python partitioning.py convert --from 2019-01 --to 2019-12   # one-off migration
+#   python partitioning.py add --through 2020-06                 # add future months
+#   python partitioning.py list
+#   python partitioning.py drop 2019-01                          # retention
+#   python partitioning.py exchange 2019-01 trips_reload          # swap in a reloaded month
+#   python partitioning.py verify --from 2019-01-01 --to 2019-01-31
+#
+# Every partition pYYYYMM holds one month; pstart holds anything older and pmax
+# anything newer than the last month. Queries filtering on pickup time only read
+# the months they touch, and a month can be dropped or exchanged in one
+# metadata operation instead of a table-wide DELETE.
+#
+# MySQL doesn't allow foreign keys on partitioned tables, so the conversion drops
+# them from trips (ingest already only loads trips whose vendor and zones exist)
+# and the primary key has to include the partitioning column.
+
+import argparse
+import os
+import sys
+from datetime import date, datetime
+from sqlalchemy import text
+from db_engine import get_engine
+import data_version
+from data_version import parse_month
+
+TABLE = "trips"
+FOREIGN_KEYS = [
+    "fk_trips_vendor",
+    "fk_trips_ratecode",
+    "fk_trips_payment",
+    "fk_trips_pu_location",
+    "fk_trips_do_location",
+]
+
+# Months further ahead than this are never created; such rows land in pmax
+MAX_MONTHS_AHEAD = int(os.getenv("PARTITION_MAX_MONTHS_AHEAD", 12))
+
+
+def next_month(month):
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def month_range(first, last):
+    month = first
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_definition(month):
+    return (f"PARTITION {partition_name(month)} "
+            f"VALUES LESS THAN ('{next_month(month):%Y-%m-%d}')")
+
+
+def existing_partitions(conn):
+    # Returns the months that have their own partition, oldest first
+    rows = conn.execute(text("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """), {"table": TABLE}).scalars().all()
+    return [datetime.strptime(name[1:], "%Y%m").date()
+            for name in rows if name[1:].isdigit()]
+
+
+def is_partitioned(conn):
+    return conn.execute(text("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+          AND PARTITION_NAME IS NOT NULL
+    """), {"table": TABLE}).scalar() > 0
+
+
+def convert(engine, first, last):
+    first, last = parse_month(first), parse_month(last)
+    definitions = [f"PARTITION pstart VALUES LESS THAN ('{first:%Y-%m-%d}')"]
+    definitions += [partition_definition(m) for m in month_range(first, last)]
+    definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            print(f"{TABLE} is already partitioned")
+            return
+        existing_fks = set(conn.execute(text("""
+            SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+              AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+        """), {"table": TABLE}).scalars().all())
+        steps = []
+        drops = [f"DROP FOREIGN KEY {fk}" for fk in FOREIGN_KEYS if fk in existing_fks]
+        if drops:
+            steps.append(f"ALTER TABLE {TABLE} " + ", ".join(drops))
+        steps.append(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, "
+                     f"ADD PRIMARY KEY (trip_id, tpep_pickup_datetime)")
+        steps.append(f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(tpep_pickup_datetime) (\n    "
+                     + ",\n    ".join(definitions) + "\n)")
+        for q in steps:
+            print(f"Executing: {q}")
+            conn.execute(text(q))
+        print(f"{TABLE} partitioned into {len(definitions)} partitions")
+
+
+def ensure_partitions(engine, months):
+    # Adds a partition for every month up to the latest of `months` (capped at
+    # MAX_MONTHS_AHEAD from today) by splitting pmax. Called by ingest before loading.
+    months = [parse_month(m) for m in months]
+    if not months:
+        return []
+    today = date.today()
+    limit = date(today.year + (today.month - 1 + MAX_MONTHS_AHEAD) // 12,
+                 (today.month - 1 + MAX_MONTHS_AHEAD) % 12 + 1, 1)
+    target = min(max(months), limit)
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return []
+        existing = existing_partitions(conn)
+        if not existing or target <= existing[-1]:
+            return []
+        added = list(month_range(next_month(existing[-1]), target))
+        definitions = [partition_definition(m) for m in added]
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO (\n    "
+            + ",\n    ".join(definitions) + "\n)"
+        ))
+        print(f"Added partitions: {', '.join(partition_name(m) for m in added)}")
+        return added
+
+
+def drop_partition(engine, month):
+    with engine.connect() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} DROP PARTITION {partition_name(parse_month(month))}"))
+    data_version.bump(engine, [month])
+
+
+def exchange_partition(engine, month, staging_table):
+    # The staging table must have the same structure without partitioning:
+    #   CREATE TABLE trips_reload LIKE trips; ALTER TABLE trips_reload REMOVE PARTITIONING;
+    # After the swap the staging table holds the month's previous rows.
+    with engine.connect() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} EXCHANGE PARTITION "
+            f"{partition_name(parse_month(month))} WITH TABLE {staging_table}"))
+    data_version.bump(engine, [month])
+
+
+def explain_partitions(conn, stmt, params):
+    # Partitions of trips read by a statement, according to EXPLAIN
+    # Values are bound before compiling so IN lists can be expanded into the SQL
+    compiled = stmt.params(params).compile(dialect=conn.dialect,
+                            compile_kwargs={"render_postcompile": True})
+    plan = conn.exec_driver_sql("EXPLAIN " + str(compiled),
+                                compiled.params).mappings().all()
+    touched = set()
+    for step in plan:
+        if step.get("partitions") and step.get("table") == TABLE:
+            touched.update(step["partitions"].split(","))
+    return touched
+
+
+def verify(engine, date_from, date_to):
+    # Checks that every dashboard statement only reads the months in the range
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "..", "backend", "api"))
+    from werkzeug.datastructures import MultiDict
+    from filters import FilterSpec
+    import queries
+
+    spec = FilterSpec.from_args(MultiDict({"date_from": date_from, "date_to": date_to}))
+    expected = {partition_name(m) for m in month_range(
+        parse_month(spec.date_from), parse_month(spec.date_to))}
+    statements = {
+        "trips_page": queries.trips_page(spec, 1),
+        "trip_totals": queries.trip_totals(spec),
+        "zone_counts": queries.zone_counts(spec),
+        "peak_hour": queries.peak_hour(spec),
+    }
+
+    ok = True
+    with engine.connect() as conn:
+        for kind, (stmt, params) in statements.items():
+            touched = explain_partitions(conn, stmt, params)
+            pruned = bool(touched) and touched <= expected
+            ok = ok and pruned
+            print(f"{'OK  ' if pruned else 'FAIL'} {kind}: {','.join(sorted(touched))}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partitioning of trips")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("convert")
+    p.add_argument("--from", dest="first", required=True, help="first month, YYYY-MM")
+    p.add_argument("--to", dest="last", required=True, help="last month, YYYY-MM")
+    p = sub.add_parser("add")
+    p.add_argument("--through", required=True, help="last month to create, YYYY-MM")
+    sub.add_parser("list")
+    p = sub.add_parser("drop")
+    p.add_argument("month")
+    p = sub.add_parser("exchange")
+    p.add_argument("month")
+    p.add_argument("staging_table")
+    p = sub.add_parser("verify")
+    p.add_argument("--from", dest="date_from", required=True, help="YYYY-MM-DD")
+    p.add_argument("--to", dest="date_to", required=True, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    engine = get_engine(isolation_level="AUTOCOMMIT")
+    if args.command == "convert":
+        convert(engine, args.first, args.last)
+    elif args.command == "add":
+        ensure_partitions(engine, [args.through])
+    elif args.command == "list":
+        with engine.connect() as conn:
+            for month in existing_partitions(conn):
+                print(partition_name(month))
+    elif args.command == "drop":
+        drop_partition(engine, args.month)
+    elif args.command == "exchange":
+        exchange_partition(engine, args.month, args.staging_table)
+    elif args.command == "verify":
+        sys.exit(0 if verify(engine, args.date_from, args.date_to) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import pytest
+from create_indexes import STATS_COLUMNS, advise, index_for, index_name, workload
+
+
+class Result(list):
+    def all(self):
+        return list(self)
+
+
+class Connection:
+    # Answers the information_schema and sys queries advise() makes
+    def __init__(self, indexes=None, foreign_keys=(), unread=None):
+        self.indexes = {"PRIMARY": ("trip_id",), **(indexes or {})}
+        self.foreign_keys = foreign_keys
+        self.unread = unread
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "information_schema.STATISTICS" in sql:
+            return Result((name, column) for name in sorted(self.indexes)
+                          for column in self.indexes[name])
+        if "information_schema.KEY_COLUMN_USAGE" in sql:
+            return Result((column,) for column in self.foreign_keys)
+        if "sys.schema_unused_indexes" in sql:
+            if self.unread is None:
+                raise RuntimeError("no sys schema")
+            return Result((name,) for name in self.unread)
+        raise AssertionError(sql)
+
+
+def shapes(*requests):
+    # (filters, ms) pairs as the query log records them
+    return workload({"filters": dict.fromkeys(filters, "x"), "ms": ms}
+                    for filters, ms in requests)
+
+
+ZONE_DAY = ("date_from", "date_to", "pickup_zone")
+DAY = ("date_from", "date_to")
+
+
+def test_workload_groups_by_filter_set():
+    result = shapes((("date_to", "date_from"), 10), (DAY, 30), (ZONE_DAY, 5))
+    assert result == {DAY: {"requests": 2, "ms": 40}, ZONE_DAY: {"requests": 1, "ms": 5}}
+
+
+def test_index_for_orders_equality_before_range():
+    columns, key_length = index_for(ZONE_DAY + ("dropoff_zone", "min_fare"), covering=False)
+    assert columns == ("PULocationID", "DOLocationID", "tpep_pickup_datetime")
+    assert key_length == 3
+    assert index_for(("pickup_hour",)) is None
+
+
+def test_covering_index_has_the_stats_columns():
+    columns, key_length = index_for(ZONE_DAY)
+    assert columns[:key_length] == ("PULocationID", "tpep_pickup_datetime")
+    assert set(columns) == set(STATS_COLUMNS)
+    assert index_name(columns, key_length) == "idx_trips_pu_pickup_cover"
+
+
+def test_proposes_for_shapes_above_min_share():
+    proposals, _, report = advise(
+        Connection(), shapes((ZONE_DAY, 700), (DAY, 290), (("min_fare",), 10)),
+        min_share=0.05, covering=False)
+    assert proposals == {
+        "idx_trips_pu_pickup": ("PULocationID", "tpep_pickup_datetime"),
+        "idx_trips_pickup": ("tpep_pickup_datetime",),
+    }
+    assert len(report) == 2
+    assert report[0].strip().startswith("70.0%")
+
+
+def test_drops_prefixes_of_other_proposals():
+    proposals, _, _ = advise(
+        Connection(), shapes((ZONE_DAY, 50), (("pickup_zone",), 50)), covering=False)
+    assert proposals == {"idx_trips_pu_pickup": ("PULocationID", "tpep_pickup_datetime")}
+
+
+def test_skips_what_an_existing_index_serves():
+    existing = {"idx_existing": ("PULocationID", "tpep_pickup_datetime", "fare_amount")}
+    proposals, _, report = advise(
+        Connection(existing), shapes((ZONE_DAY, 50), (("pickup_zone",), 50)), covering=False)
+    assert proposals == {}
+    assert any("already served by idx_existing" in line for line in report)
+
+
+def test_no_filters_proposes_nothing():
+    proposals, _, report = advise(Connection(), shapes(((), 100)))
+    assert proposals == {}
+    assert "(no filters)" in report[0]
+
+
+@pytest.mark.parametrize("unread, expected", [
+    (None, ["idx_trips_fare", "idx_trips_payment"]),
+    (["idx_trips_payment"], ["idx_trips_payment"]),
+    ([], []),
+])
+def test_unused_indexes(unread, expected):
+    existing = {
+        "idx_trips_pickup": ("tpep_pickup_datetime",),
+        "idx_trips_fare": ("fare_amount",),
+        "idx_trips_payment": ("payment_type", "fare_amount"),
+    }
+    _, unused, _ = advise(Connection(existing, unread=unread), shapes((DAY, 100)))
+    assert unused == expected
+
+
+def test_keeps_one_index_per_foreign_key():
+    existing = {
+        "fk_vendor": ("VendorID",),
+        "idx_vendor_fare": ("VendorID", "fare_amount"),
+        "fk_rate": ("RatecodeID",),
+    }
+    _, unused, _ = advise(Connection(existing, foreign_keys=["VendorID", "RatecodeID"]),
+                          shapes((DAY, 100)))
+    # Either VendorID index may go, not both; RatecodeID's only index stays
+    assert unused == ["fk_vendor"]
@@ -0,0 +1,97 @@
+import json
+import pandas as pd
+import pytest
+from dataset_profile import Profile, quantile
+
+
+def trips(rows):
+    df = pd.DataFrame(rows, columns=["tpep_pickup_datetime", "fare_amount",
+                                     "passenger_count", "VendorID"])
+    df["tpep_pickup_datetime"] = pd.to_datetime(df["tpep_pickup_datetime"])
+    return df
+
+
+FIRST = trips([
+    ("2019-01-03 10:00", 4.5, 1, 1),
+    ("2019-01-20 08:00", 12.0, 2, 2),
+    ("2019-02-01 00:30", None, 1, 1),
+])
+SECOND = trips([
+    ("2018-12-31 23:00", 250.0, 6, 2),
+    ("2019-02-14 18:00", 30.0, None, 2),
+])
+
+
+def profile(*chunks):
+    result = Profile()
+    for chunk in chunks:
+        result.add(chunk)
+    return result
+
+
+def test_merge_equals_profiling_both_chunks():
+    merged = profile(FIRST).merge(profile(SECOND))
+    assert merged.data == profile(pd.concat([FIRST, SECOND], ignore_index=True)).data
+
+
+def test_merge_is_order_independent():
+    assert profile(FIRST).merge(profile(SECOND)).data == profile(SECOND).merge(profile(FIRST)).data
+
+
+def test_merge_copies_new_columns():
+    other = profile(SECOND)
+    before = json.loads(json.dumps(other.data))
+    merged = Profile().merge(other)
+    merged.add(FIRST)
+    assert other.data == before
+
+
+def test_merge_keeps_counts_when_bins_changed():
+    ours, theirs = profile(FIRST), profile(SECOND)
+    theirs.data["columns"]["fare_amount"]["histogram"]["edges"] = [100]
+    counts = list(ours.data["columns"]["fare_amount"]["histogram"]["counts"])
+    ours.merge(theirs)
+    fare = ours.data["columns"]["fare_amount"]
+    assert fare["histogram"]["counts"] == counts
+    # min/max and nulls still add up
+    assert (fare["min"], fare["max"], fare["nulls"]) == (4.5, 250.0, 1)
+
+
+def test_add_summarises_columns():
+    data = profile(FIRST, SECOND).data
+    fare = data["columns"]["fare_amount"]
+    assert data["rows"] == 5
+    assert (fare["min"], fare["max"], fare["nulls"]) == (4.5, 250.0, 1)
+    # Values on an edge go to the bin above it
+    passengers = data["columns"]["passenger_count"]["histogram"]["counts"]
+    assert passengers[:3] == [0, 2, 1]
+    assert data["columns"]["tpep_pickup_datetime"]["months"] == {
+        "2018-12": 1, "2019-01": 2, "2019-02": 2}
+    assert data["values"]["VendorID"] == {"1": 2, "2": 3}
+
+
+def column(counts, edges=(10, 20, 30), max_value=45.0):
+    return {"max": max_value, "histogram": {"edges": list(edges), "counts": counts}}
+
+
+@pytest.mark.parametrize("q, expected", [
+    (0.1, 10),
+    (0.5, 20),
+    (0.6, 30),
+    (0.99, 45.0),
+    (1.0, 45.0),
+])
+def test_quantile(q, expected):
+    assert quantile(column([1, 4, 1, 4]), q) == expected
+
+
+def test_quantile_never_exceeds_the_max():
+    assert quantile(column([0, 5, 5, 0], max_value=25.0), 0.99) == 25.0
+
+
+@pytest.mark.parametrize("value", [
+    {"max": None, "histogram": {"edges": [10], "counts": [0, 0]}},
+    {"min": "2019-01-01", "max": "2019-01-31", "months": {}},
+])
+def test_quantile_without_counts(value):
+    assert quantile(value, 0.5) is None
@@ -0,0 +1,69 @@
+import sqlite3
+import pytest
+from maintenance import sargable
+
+COLUMN = "tpep_pickup_datetime"
+
+
+@pytest.mark.parametrize("predicate, expected", [
+    ("YEAR(tpep_pickup_datetime) = 2088",
+     "(tpep_pickup_datetime >= '2088-01-01 00:00:00' AND tpep_pickup_datetime < '2089-01-01 00:00:00')"),
+    ("year( `tpep_pickup_datetime` ) <> '2019'",
+     "(`tpep_pickup_datetime` < '2019-01-01 00:00:00' OR `tpep_pickup_datetime` >= '2020-01-01 00:00:00')"),
+    ("YEAR(tpep_pickup_datetime) < 2009", "tpep_pickup_datetime < '2009-01-01 00:00:00'"),
+    ("YEAR(tpep_pickup_datetime) <= 2009", "tpep_pickup_datetime < '2010-01-01 00:00:00'"),
+    ("YEAR(tpep_pickup_datetime) > 2020", "tpep_pickup_datetime >= '2021-01-01 00:00:00'"),
+    ("YEAR(tpep_pickup_datetime)>=2020", "tpep_pickup_datetime >= '2020-01-01 00:00:00'"),
+    ("DATE(tpep_dropoff_datetime) = '2019-12-31'",
+     "(tpep_dropoff_datetime >= '2019-12-31 00:00:00' AND tpep_dropoff_datetime < '2020-01-01 00:00:00')"),
+    ("DATE(tpep_pickup_datetime) != '2019-02-28'",
+     "(tpep_pickup_datetime < '2019-02-28 00:00:00' OR tpep_pickup_datetime >= '2019-03-01 00:00:00')"),
+    ("DATE(tpep_pickup_datetime) > '2019-01-31'", "tpep_pickup_datetime >= '2019-02-01 00:00:00'"),
+])
+def test_rewrites(predicate, expected):
+    assert sargable(predicate) == expected
+
+
+@pytest.mark.parametrize("predicate", [
+    "passenger_count = 0 OR trip_distance = 0",
+    "tpep_pickup_datetime < '2009-01-01'",
+    "MONTH(tpep_pickup_datetime) = 2",
+    "YEAR(tpep_pickup_datetime) IN (2001, 2002)",
+])
+def test_leaves_the_rest_alone(predicate):
+    assert sargable(predicate) == predicate
+
+
+def test_rewrites_every_call_in_a_predicate():
+    predicate = "(YEAR(tpep_pickup_datetime) = 2088 OR DATE(tpep_dropoff_datetime) < '2009-01-01') AND fare_amount < 0"
+    rewritten = sargable(predicate)
+    assert "YEAR(" not in rewritten and "DATE(" not in rewritten
+    assert rewritten.endswith(" AND fare_amount < 0")
+
+
+@pytest.fixture
+def trips():
+    # Pickups on and around the boundaries, with the MySQL functions
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("YEAR", 1, lambda value: int(value[:4]))
+    conn.create_function("DATE", 1, lambda value: value[:10])
+    conn.execute(f"CREATE TABLE trips (trip_id INTEGER PRIMARY KEY, {COLUMN} TEXT)")
+    times = ["2018-12-31 23:59:59", "2019-01-01 00:00:00", "2019-06-15 12:00:00",
+             "2019-12-31 23:59:59", "2020-01-01 00:00:00", "2020-02-29 00:00:00",
+             "2020-02-29 23:59:59", "2020-03-01 00:00:00"]
+    conn.executemany(f"INSERT INTO trips ({COLUMN}) VALUES (?)", [(t,) for t in times])
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("operator", ["=", "<>", "!=", "<", "<=", ">", ">="])
+@pytest.mark.parametrize("call", [f"YEAR({COLUMN}) {{}} 2019", f"DATE({COLUMN}) {{}} '2020-02-29'"])
+def test_same_rows(trips, call, operator):
+    predicate = call.format(operator)
+    rewritten = sargable(predicate)
+    assert rewritten != predicate
+
+    def ids(where):
+        return [row[0] for row in trips.execute(f"SELECT trip_id FROM trips WHERE {where}")]
+
+    assert ids(rewritten) == ids(predicate)
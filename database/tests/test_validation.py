@@ -0,0 +1,89 @@
+import json
+import pandas as pd
+import pytest
+from validation import RULES, Validator
+
+CONTEXT = {"location_ids": {1, 2, 3}}
+GOOD = {
+    "VendorID": 1,
+    "tpep_pickup_datetime": pd.Timestamp("2019-01-01 10:00"),
+    "tpep_dropoff_datetime": pd.Timestamp("2019-01-01 10:30"),
+    "passenger_count": 1,
+    "trip_distance": 5.0,
+    "PULocationID": 1,
+    "DOLocationID": 2,
+    "fare_amount": 12.0,
+    "total_amount": 15.0,
+}
+# One row breaking each rule alone, in rule order
+BROKEN = {
+    "missing_time": {"tpep_dropoff_datetime": pd.NaT},
+    "pickup_out_of_range": {"tpep_pickup_datetime": pd.Timestamp("2088-01-01 10:00"),
+                            "tpep_dropoff_datetime": pd.Timestamp("2088-01-01 10:30")},
+    "dropoff_before_pickup": {"tpep_dropoff_datetime": pd.Timestamp("2019-01-01 09:00")},
+    "too_long": {"tpep_dropoff_datetime": pd.Timestamp("2019-01-03 10:00")},
+    "missing_vendor": {"VendorID": None},
+    "unknown_location": {"DOLocationID": 999},
+    "missing_passengers": {"passenger_count": None},
+    "missing_total": {"total_amount": None},
+    "zero_passengers": {"passenger_count": 0},
+    "zero_distance": {"trip_distance": 0.0},
+    "zero_fare": {"fare_amount": -3.0},
+    "impossible_speed": {"trip_distance": 400.0},
+}
+
+
+def chunk(*overrides):
+    return pd.DataFrame([dict(GOOD, **override) for override in overrides])
+
+
+@pytest.fixture
+def validator(tmp_path):
+    return Validator("yellow_tripdata_2019-01.csv", CONTEXT, directory=str(tmp_path))
+
+
+def test_every_rule_has_a_case():
+    assert list(BROKEN) == [name for name, _, _ in RULES]
+
+
+def test_each_rule_rejects_its_row(validator):
+    accepted = validator.apply(chunk({}, *BROKEN.values(), {}))
+    assert len(accepted) == 2
+    assert validator.counts == {name: 1 for name in BROKEN}
+    assert validator.rejected == len(BROKEN)
+    quarantined = pd.read_csv(validator.rejected_path)
+    assert list(quarantined["rule"]) == list(BROKEN)
+
+
+def test_first_rule_wins(validator):
+    # Zero passengers and zero fare, with no vendor: counted once, under the
+    # earliest of the three rules
+    validator.apply(chunk({"passenger_count": 0, "fare_amount": 0.0, "VendorID": None}))
+    assert validator.rejected == 1
+    assert validator.counts["missing_vendor"] == 1
+
+
+def test_missing_values_dont_slip_through(validator):
+    accepted = validator.apply(chunk({"trip_distance": None}, {"fare_amount": None}))
+    assert accepted.empty
+    assert validator.counts["zero_distance"] == validator.counts["zero_fare"] == 1
+
+
+def test_counts_add_up_across_chunks(validator):
+    validator.apply(chunk({}, BROKEN["zero_fare"]))
+    validator.apply(chunk(BROKEN["zero_fare"], BROKEN["missing_vendor"], {}))
+    summary = validator.report()
+    assert summary["accepted"] == 2
+    assert summary["rejected"] == 3
+    assert summary["rules"]["zero_fare"]["rejected"] == 2
+    with open(validator.summary_path) as f:
+        assert json.load(f) == summary
+    assert len(pd.read_csv(validator.rejected_path)) == 3
+
+
+def test_new_load_starts_a_new_quarantine_file(tmp_path):
+    first = Validator("a.csv", CONTEXT, directory=str(tmp_path))
+    first.apply(chunk(BROKEN["zero_fare"]))
+    second = Validator("a.csv", CONTEXT, directory=str(tmp_path))
+    second.apply(chunk(BROKEN["missing_vendor"]))
+    assert list(pd.read_csv(second.rejected_path)["rule"]) == ["missing_vendor"]
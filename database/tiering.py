@@ -0,0 +1,183 @@
+# Moves old months of trips out of MySQL into compressed Parquet files that
+# the API reads with DuckDB (backend/api/cold_storage.py).
+#
+#   python tiering.py list
+#   python tiering.py archive 2019-01                  # one month
+#   python tiering.py archive --older-than 24          # every month older than 24 months
+#
+# A month is written to COLD_DATA_DIR/month=YYYY-MM/trips.parquet (zstd, sorted
+# by pickup time) under a temporary name, read back to check its row count
+# against MySQL, and only then removed from trips: by dropping its partition
+# when the table is partitioned (see partitioning.py), otherwise with a range
+# DELETE. The file is renamed into place after that, and the month's
+# data_version is bumped.
+
+import argparse
+import os
+from datetime import date
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from db_engine import get_engine
+import data_version
+from partitioning import (TABLE, parse_month, next_month, partition_name,
+                          existing_partitions, is_partitioned)
+
+COLD_DATA_DIR = os.getenv("COLD_DATA_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "cold"))
+CHUNK_ROWS = int(os.getenv("TIERING_CHUNK_ROWS", 100000))
+ROW_GROUP_ROWS = 500000
+
+AMOUNT = pa.decimal128(10, 2)
+SCHEMA = pa.schema([
+    ("trip_id", pa.int64()),
+    ("VendorID", pa.int64()),
+    ("tpep_pickup_datetime", pa.timestamp("s")),
+    ("tpep_dropoff_datetime", pa.timestamp("s")),
+    ("passenger_count", pa.int32()),
+    ("trip_distance", AMOUNT),
+    ("RatecodeID", pa.int64()),
+    ("store_and_fwd_flag", pa.string()),
+    ("PULocationID", pa.int64()),
+    ("DOLocationID", pa.int64()),
+    ("payment_type", pa.int64()),
+    ("fare_amount", AMOUNT),
+    ("extra", AMOUNT),
+    ("mta_tax", AMOUNT),
+    ("tip_amount", AMOUNT),
+    ("tolls_amount", AMOUNT),
+    ("improvement_surcharge", AMOUNT),
+    ("total_amount", AMOUNT),
+    ("congestion_surcharge", AMOUNT),
+])
+
+
+def month_path(month):
+    return os.path.join(COLD_DATA_DIR, f"month={month:%Y-%m}", "trips.parquet")
+
+
+def months_older_than(months_back):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def hot_months(conn):
+    # Months that still have rows in MySQL, oldest first
+    rows = conn.execute(text(f"""
+        SELECT DISTINCT DATE_FORMAT(tpep_pickup_datetime, '%Y-%m-01')
+        FROM {TABLE} ORDER BY 1
+    """)).scalars().all()
+    return [parse_month(value) for value in rows]
+
+
+def _batch(rows):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(SCHEMA, columns):
+        if pa.types.is_decimal(field.type):
+            values = [None if v is None else Decimal(v).quantize(Decimal("0.01"))
+                      for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def write_month(engine, month):
+    # Streams the month with a server-side cursor into a temporary file next to
+    # the final one, which the API doesn't read. Returns (temporary path, rows).
+    path = month_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    written = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(
+            f"SELECT {', '.join(SCHEMA.names)} FROM {TABLE} "
+            "WHERE tpep_pickup_datetime >= :start AND tpep_pickup_datetime < :end "
+            "ORDER BY tpep_pickup_datetime, trip_id"
+        ), {"start": month, "end": next_month(month)})
+        with pq.ParquetWriter(tmp_path, SCHEMA, compression="zstd") as writer:
+            for rows in result.partitions(CHUNK_ROWS):
+                writer.write_batch(_batch(rows), row_group_size=ROW_GROUP_ROWS)
+                written += len(rows)
+    return tmp_path, written
+
+
+def hot_count(conn, month):
+    return conn.execute(text(
+        f"SELECT COUNT(*) FROM {TABLE} "
+        "WHERE tpep_pickup_datetime >= :start AND tpep_pickup_datetime < :end"
+    ), {"start": month, "end": next_month(month)}).scalar()
+
+
+def remove_month(conn, month):
+    if is_partitioned(conn) and month in existing_partitions(conn):
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} DROP PARTITION {partition_name(month)}"))
+    else:
+        conn.execute(text(
+            f"DELETE FROM {TABLE} "
+            "WHERE tpep_pickup_datetime >= :start AND tpep_pickup_datetime < :end"
+        ), {"start": month, "end": next_month(month)})
+
+
+def archive(engine, month):
+    # The API merges every published trips.parquet with MySQL, so the file is
+    # only published once the month has left MySQL; until then it would be
+    # counted twice. In between, the month is briefly missing instead.
+    month = parse_month(month)
+    tmp_path, written = write_month(engine, month)
+    try:
+        stored = pq.ParquetFile(tmp_path).metadata.num_rows
+        with engine.connect() as conn:
+            expected = hot_count(conn, month)
+            if stored != written or stored != expected:
+                raise RuntimeError(
+                    f"{month:%Y-%m}: wrote {stored} rows but trips has {expected}; "
+                    "leaving MySQL untouched")
+            remove_month(conn, month)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, month_path(month))
+    # Results cached while the month moved are stale
+    data_version.bump(engine, [month])
+    print(f"Archived {month:%Y-%m}: {stored} rows -> {month_path(month)}")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tier old months of trips to Parquet")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("archive")
+    p.add_argument("month", nargs="?", help="month to archive, YYYY-MM")
+    p.add_argument("--older-than", type=int, metavar="MONTHS",
+                   help="archive every month older than this many months")
+    args = parser.parse_args()
+
+    engine = get_engine(isolation_level="AUTOCOMMIT")
+    if args.command == "list":
+        with engine.connect() as conn:
+            for month in hot_months(conn):
+                print(f"hot   {month:%Y-%m}")
+        for name in sorted(os.listdir(COLD_DATA_DIR)) if os.path.isdir(COLD_DATA_DIR) else []:
+            # Directories holding only a .tmp file are archives in progress
+            if name.startswith("month=") and os.path.exists(
+                    os.path.join(COLD_DATA_DIR, name, "trips.parquet")):
+                print(f"cold  {name[len('month='):]}")
+    elif args.command == "archive":
+        if args.month:
+            months = [parse_month(args.month)]
+        elif args.older_than is not None:
+            cutoff = months_older_than(args.older_than)
+            with engine.connect() as conn:
+                months = [m for m in hot_months(conn) if m < cutoff]
+        else:
+            parser.error("archive needs a month or --older-than")
+        for month in months:
+            archive(engine, month)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Validation rules applied to every chunk of trips during ingest, so bad rows
+# never reach the trips table (db_modification.sql shows the table-wide DELETEs
+# this replaces). Each rule is a vectorized check returning the rows it
+# rejects; a row is quarantined under the first rule that rejects it, so the
+# per-rule counts add up to the rows rejected.
+#
+# Rejected rows are appended to QUARANTINE_DIR/<source>.rejected.csv with the
+# rule's name in a "rule" column, and the counts are written next to it as
+# <source>.rejected.json once the load finishes.
+
+import json
+import os
+from datetime import date
+import pandas as pd
+
+QUARANTINE_DIR = os.getenv("QUARANTINE_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "quarantine"))
+
+# Pickups outside this range are rejected (the raw files contain e.g. 2088)
+VALID_FROM = pd.Timestamp(os.getenv("INGEST_VALID_FROM", "2009-01-01"))
+VALID_TO = pd.Timestamp(os.getenv("INGEST_VALID_TO", date.today().isoformat())) \
+    + pd.Timedelta(days=1)
+MAX_MPH = float(os.getenv("INGEST_MAX_MPH", 100))
+MAX_HOURS = float(os.getenv("INGEST_MAX_HOURS", 24))
+
+
+def _hours(df):
+    return (df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]).dt.total_seconds() / 3600
+
+
+# (name, description, check). Checks get the chunk and the ingest context and
+# return a boolean Series, True for the rows to reject.
+RULES = [
+    ("missing_time", "pickup or dropoff time missing or unparseable",
+     lambda df, ctx: df["tpep_pickup_datetime"].isna() | df["tpep_dropoff_datetime"].isna()),
+    ("pickup_out_of_range", f"pickup outside {VALID_FROM:%Y-%m-%d} .. {VALID_TO:%Y-%m-%d}",
+     lambda df, ctx: (df["tpep_pickup_datetime"] < VALID_FROM)
+     | (df["tpep_pickup_datetime"] >= VALID_TO)),
+    ("dropoff_before_pickup", "dropoff at or before pickup",
+     lambda df, ctx: df["tpep_dropoff_datetime"] <= df["tpep_pickup_datetime"]),
+    ("too_long", f"trip longer than {MAX_HOURS:g} hours",
+     lambda df, ctx: _hours(df) > MAX_HOURS),
+    ("missing_vendor", "no VendorID",
+     lambda df, ctx: df["VendorID"].isna()),
+    ("unknown_location", "pickup or dropoff LocationID not in the zone lookup",
+     lambda df, ctx: ~df["PULocationID"].isin(ctx["location_ids"])
+     | ~df["DOLocationID"].isin(ctx["location_ids"])),
+    ("missing_passengers", "no passenger_count",
+     lambda df, ctx: df["passenger_count"].isna()),
+    ("missing_total", "no total_amount",
+     lambda df, ctx: df["total_amount"].isna()),
+    ("zero_passengers", "passenger_count of 0",
+     lambda df, ctx: df["passenger_count"] == 0),
+    ("zero_distance", "trip_distance of 0 or less",
+     lambda df, ctx: ~(df["trip_distance"] > 0)),
+    ("zero_fare", "fare_amount of 0 or less",
+     lambda df, ctx: ~(df["fare_amount"] > 0)),
+    ("impossible_speed", f"average speed above {MAX_MPH:g} mph",
+     lambda df, ctx: df["trip_distance"] / _hours(df) > MAX_MPH),
+]
+
+
+class Validator:
+    def __init__(self, source, context, directory=QUARANTINE_DIR, rules=RULES):
+        # context holds what the rules look up, e.g. {"location_ids": {...}}
+        self.context = context
+        self.rules = rules
+        self.counts = {name: 0 for name, _, _ in rules}
+        self.accepted = 0
+        name = os.path.splitext(os.path.basename(source))[0]
+        os.makedirs(directory, exist_ok=True)
+        self.rejected_path = os.path.join(directory, f"{name}.rejected.csv")
+        self.summary_path = os.path.join(directory, f"{name}.rejected.json")
+        # A new load starts a new quarantine file
+        if os.path.exists(self.rejected_path):
+            os.remove(self.rejected_path)
+
+    def apply(self, df):
+        # Returns the accepted rows; rejected ones go to the quarantine file
+        rule = pd.Series(None, index=df.index, dtype=object)
+        for name, _, check in self.rules:
+            # Comparisons with missing values are False, so a check like
+            # x == 0 lets NaN through; every NOT NULL column has a missing_*
+            # rule or a check that rejects NaN (~(x > 0), ~isin)
+            failed = check(df, self.context).fillna(False).astype(bool) & rule.isna()
+            rule[failed] = name
+            self.counts[name] += int(failed.sum())
+
+        rejected = rule.notna()
+        if rejected.any():
+            bad = df[rejected].assign(rule=rule[rejected])
+            bad.to_csv(self.rejected_path, mode="a", index=False,
+                       header=not os.path.exists(self.rejected_path))
+        accepted = df[~rejected]
+        self.accepted += len(accepted)
+        return accepted
+
+    @property
+    def rejected(self):
+        return sum(self.counts.values())
+
+    def report(self):
+        summary = {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rules": {
+                name: {"description": description, "rejected": self.counts[name]}
+                for name, description, _ in self.rules
+            },
+        }
+        with open(self.summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Accepted {self.accepted} rows, quarantined {self.rejected} "
+              f"to {self.rejected_path}")
+        for name, _, _ in self.rules:
+            if self.counts[name]:
+                print(f"  {name}: {self.counts[name]}")
+        return summary
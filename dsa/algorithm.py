@@ -1,62 +1,248 @@
-import mysql.connector
-import time
+# Per-zone trip aggregation: trip count, average fare and peak pickup hour for
+# any number of pickup zones at once.
+#
+# Three interchangeable methods:
+#   dict        - the original algorithm: fetch everything, loop in Python with a dict
+#   vectorized  - stream rows with fetchmany into NumPy and aggregate with bincount/argmax
+#   sql         - push the aggregation down to MySQL (GROUP BY)
+#
+# Usage:
+#   python algorithm.py 81 132 161                # vectorized, prints per-phase timings
+#   python algorithm.py 81 --method dict
+#   python algorithm.py --benchmark --repeat 3    # all zones, compares the three methods
+
+import argparse
+import numpy as np
 import os
+import pymysql
+import time
 from dotenv import load_dotenv
 
-# DB connection 
-con = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    port=int(os.getenv("DB_PORT")), 
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASS"),
-    database=os.getenv("DB_NAME")
-)
-cursor = con.cursor(buffered=False) 
-
-
-target_zone = 81 
-
-query = "SELECT fare_amount, tpep_pickup_datetime FROM trips WHERE PULocationID = %s"
-cursor.execute(query, (target_zone,))
-data_subset = cursor.fetchall() 
-
-
-
-start_time = time.perf_counter()
-
-hour_map = {}
-total_fare_sum = 0.0
-trip_count = 0
-
-for fare, dt in data_subset:
-    trip_count += 1
-    
-    total_fare_sum += float(fare)
-    
-    hour = dt.hour
-    if hour in hour_map:
-        hour_map[hour] += 1
-    else:
-        hour_map[hour] = 1
-
-average_fare = total_fare_sum / trip_count if trip_count > 0 else 0
-
-peak_hour = None
-max_val = -1
-for hour, count in hour_map.items():
-    if count > max_val:
-        max_val = count
-        peak_hour = hour
-
-end_time = time.perf_counter()
-print("")
-print("==============================")
-print(f"Zone id: {target_zone}")
-print(f"Total trips: {trip_count}")
-print(f"average fare: ${average_fare:.2f}")
-print(f"peak Hour: {peak_hour}:00")
-print(f"total time: {end_time - start_time:.6f} seconds")
-print("==============================")
-
-cursor.close()
-con.close()
+load_dotenv()
+
+HOURS = 24
+
+
+def connect():
+    return pymysql.connect(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD", os.getenv("DB_PASS")),
+        database=os.getenv("DB_NAME")
+    )
+
+
+class Timings:
+    # Accumulates wall time per phase; "total" is measured end to end
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def measure(self, phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.add(phase, time.perf_counter() - start)
+        return result
+
+
+def all_zones(con):
+    cursor = con.cursor()
+    cursor.execute("SELECT LocationID FROM locations ORDER BY LocationID")
+    zones = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return zones
+
+
+def _zone_filter(zones):
+    placeholders = ", ".join(["%s"] * len(zones))
+    return f"PULocationID IN ({placeholders})"
+
+
+def summarize(zones, trips, fare_sums, hourly):
+    results = {}
+    for i, zone in enumerate(zones):
+        count = int(trips[i])
+        results[zone] = {
+            "trips": count,
+            "average_fare": float(fare_sums[i]) / count if count else 0.0,
+            "peak_hour": int(np.argmax(hourly[i])) if count else None,
+        }
+    return results
+
+
+def aggregate_dict(con, zones, timings, chunk_size=None):
+    # Unbuffered, as before; fetchall reads the rows off the socket
+    cursor = con.cursor(pymysql.cursors.SSCursor)
+    timings.measure("execute", cursor.execute,
+                    "SELECT PULocationID, fare_amount, tpep_pickup_datetime "
+                    "FROM trips WHERE " + _zone_filter(zones), zones)
+    data_subset = timings.measure("fetch", cursor.fetchall)
+    cursor.close()
+
+    start = time.perf_counter()
+    stats = {zone: [0, 0.0, {}] for zone in zones}
+    for zone, fare, dt in data_subset:
+        entry = stats[zone]
+        entry[0] += 1
+        entry[1] += float(fare)
+        hour_map = entry[2]
+        if dt.hour in hour_map:
+            hour_map[dt.hour] += 1
+        else:
+            hour_map[dt.hour] = 1
+
+    results = {}
+    for zone, (trip_count, total_fare_sum, hour_map) in stats.items():
+        peak_hour = None
+        max_val = -1
+        for hour, count in hour_map.items():
+            # Ties go to the earliest hour, like argmax in the other methods
+            if count > max_val or (count == max_val and hour < peak_hour):
+                max_val = count
+                peak_hour = hour
+        results[zone] = {
+            "trips": trip_count,
+            "average_fare": total_fare_sum / trip_count if trip_count > 0 else 0.0,
+            "peak_hour": peak_hour,
+        }
+    timings.add("aggregate", time.perf_counter() - start)
+    return results
+
+
+def aggregate_vectorized(con, zones, timings, chunk_size=50000):
+    # Compact index per zone, so zone/hour pairs map to one bincount slot
+    lookup = np.full(max(zones) + 1, -1, dtype=np.int64)
+    lookup[zones] = np.arange(len(zones))
+    hourly = np.zeros(len(zones) * HOURS, dtype=np.int64)
+    fare_sums = np.zeros(len(zones), dtype=np.float64)
+
+    # Unbuffered, so fetchmany streams the result instead of loading it whole
+    cursor = con.cursor(pymysql.cursors.SSCursor)
+    # The hour is extracted by MySQL, so every column arrives as a number
+    timings.measure("execute", cursor.execute,
+                    "SELECT PULocationID, HOUR(tpep_pickup_datetime), fare_amount "
+                    "FROM trips WHERE " + _zone_filter(zones), zones)
+    while True:
+        rows = timings.measure("fetch", cursor.fetchmany, chunk_size)
+        if not rows:
+            break
+        start = time.perf_counter()
+        chunk = np.array(rows, dtype=np.float64)
+        zone_idx = lookup[chunk[:, 0].astype(np.int64)]
+        hours = chunk[:, 1].astype(np.int64)
+        hourly += np.bincount(zone_idx * HOURS + hours,
+                              minlength=len(zones) * HOURS)
+        fare_sums += np.bincount(zone_idx, weights=chunk[:, 2],
+                                 minlength=len(zones))
+        timings.add("aggregate", time.perf_counter() - start)
+    cursor.close()
+
+    start = time.perf_counter()
+    hourly = hourly.reshape(len(zones), HOURS)
+    results = summarize(zones, hourly.sum(axis=1), fare_sums, hourly)
+    timings.add("aggregate", time.perf_counter() - start)
+    return results
+
+
+def aggregate_sql(con, zones, timings, chunk_size=None):
+    index = {zone: i for i, zone in enumerate(zones)}
+    hourly = np.zeros((len(zones), HOURS), dtype=np.int64)
+    fare_sums = np.zeros(len(zones), dtype=np.float64)
+
+    cursor = con.cursor()
+    timings.measure("execute", cursor.execute,
+                    "SELECT PULocationID, HOUR(tpep_pickup_datetime), COUNT(*), SUM(fare_amount) "
+                    "FROM trips WHERE " + _zone_filter(zones) +
+                    " GROUP BY PULocationID, HOUR(tpep_pickup_datetime)", zones)
+    rows = timings.measure("fetch", cursor.fetchall)
+    cursor.close()
+
+    start = time.perf_counter()
+    for zone, hour, count, fare_sum in rows:
+        hourly[index[zone], hour] = count
+        fare_sums[index[zone]] += float(fare_sum)
+    results = summarize(zones, hourly.sum(axis=1), fare_sums, hourly)
+    timings.add("aggregate", time.perf_counter() - start)
+    return results
+
+
+METHODS = {
+    "dict": aggregate_dict,
+    "vectorized": aggregate_vectorized,
+    "sql": aggregate_sql,
+}
+
+
+def run(method, zones=None, chunk_size=50000):
+    # Returns (results, timings) with connect/execute/fetch/aggregate/total phases
+    timings = Timings()
+    start = time.perf_counter()
+    con = timings.measure("connect", connect)
+    try:
+        zones = sorted(zones or all_zones(con))
+        results = METHODS[method](con, zones, timings, chunk_size)
+    finally:
+        con.close()
+    timings.add("total", time.perf_counter() - start)
+    return results, timings
+
+
+def print_results(results):
+    print("==============================")
+    for zone, r in results.items():
+        peak = f"{r['peak_hour']}:00" if r["peak_hour"] is not None else "N/A"
+        print(f"Zone id: {zone}  trips: {r['trips']}  "
+              f"average fare: ${r['average_fare']:.2f}  peak hour: {peak}")
+    print("==============================")
+
+
+def print_timings(method, timings):
+    phases = ["connect", "execute", "fetch", "aggregate", "total"]
+    print(f"{method:<11}" + "".join(
+        f"{phase}: {timings.phases.get(phase, 0.0):.4f}s  " for phase in phases))
+
+
+def benchmark(zones, repeat, chunk_size):
+    reference = None
+    for method in METHODS:
+        best = None
+        for _ in range(repeat):
+            results, timings = run(method, zones, chunk_size)
+            if best is None or timings.phases["total"] < best.phases["total"]:
+                best = timings
+        print_timings(method, best)
+
+        # All methods must agree on the answer
+        summary = {z: (r["trips"], round(r["average_fare"], 2), r["peak_hour"])
+                   for z, r in results.items()}
+        if reference is None:
+            reference = summary
+        elif summary != reference:
+            print(f"warning: {method} results differ from {next(iter(METHODS))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-zone trip aggregation")
+    parser.add_argument("zones", nargs="*", type=int,
+                        help="pickup LocationIDs (default: all zones)")
+    parser.add_argument("--method", choices=METHODS, default="vectorized")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time every method on the same zones")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.zones, args.repeat, args.chunk_size)
+        return
+
+    results, timings = run(args.method, args.zones, args.chunk_size)
+    print_results(results)
+    print_timings(args.method, timings)
+
+
+if __name__ == "__main__":
+    main()
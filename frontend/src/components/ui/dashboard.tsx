@@ -108,6 +108,52 @@ function onEachZone(feature: GeoJSON.Feature, layer: Layer) {
 
 const API = import.meta.env.VITE_API_URL || "http://127.0.0.1:3000/api";
 
+// Filter bounds used until /meta/ranges answers (or if it can't)
+interface Bounds {
+  passengers: [number, number];
+  distance: [number, number];
+  fare: [number, number];
+  dateMin: Date;
+  dateMax: Date;
+}
+
+interface ColumnRange {
+  min: number | string | null;
+  max: number | string | null;
+  p99: number | null;
+}
+
+const DEFAULT_BOUNDS: Bounds = {
+  passengers: [0, 9],
+  distance: [0, 100],
+  fare: [0, 500],
+  dateMin: new Date("2008-01-01"),
+  dateMax: new Date("2019-12-31"),
+};
+
+// Slider bounds from the dataset profile; the 99th percentile keeps a few
+// outliers from stretching the slider
+function boundsFromRanges(ranges: Record<string, ColumnRange>): Bounds {
+  const numeric = (
+    name: string,
+    fallback: [number, number],
+    upper: "p99" | "max" = "p99"
+  ): [number, number] => {
+    const range = ranges[name];
+    const high = range?.[upper] ?? range?.max;
+    if (range?.min == null || high == null) return fallback;
+    return [Math.floor(Number(range.min)), Math.ceil(Number(high))];
+  };
+  const pickup = ranges["tpep_pickup_datetime"];
+  return {
+    passengers: numeric("passenger_count", DEFAULT_BOUNDS.passengers, "max"),
+    distance: numeric("trip_distance", DEFAULT_BOUNDS.distance),
+    fare: numeric("fare_amount", DEFAULT_BOUNDS.fare),
+    dateMin: pickup?.min ? new Date(String(pickup.min)) : DEFAULT_BOUNDS.dateMin,
+    dateMax: pickup?.max ? new Date(String(pickup.max)) : DEFAULT_BOUNDS.dateMax,
+  };
+}
+
 function SearchableSelect({
   options,
   value,
@@ -200,7 +246,9 @@ export function Dashboard() {
   const [fare, setFare] = useState([0, 200]);
   const [pickupTime, setPickupTime] = useState("");
   const [dropoffTime, setDropoffTime] = useState("");
+  const [bounds, setBounds] = useState<Bounds>(DEFAULT_BOUNDS);
   const [page, setPage] = useState(1);
+  const [totalPages, setTotalPages] = useState<number | null>(null);
   const abortControllerRef = useRef<AbortController | null>(null);
 
   const [trips, setTrips] = useState<Trip[]>([]);
@@ -244,6 +292,14 @@ export function Dashboard() {
       .catch(console.error);
   }, []);
 
+  // Slider and date picker bounds come from the precomputed dataset profile
+  useEffect(() => {
+    fetch(`${API}/meta/ranges`)
+      .then((r) => r.json())
+      .then((data) => setBounds(boundsFromRanges(data.ranges || {})))
+      .catch(console.error);
+  }, []);
+
   // Turn all our filter variables into a proper URL query string that the backend understands
   const buildParams = useCallback(
     (overridePage?: number) => {
@@ -300,23 +356,16 @@ export function Dashboard() {
 
       const toastId = toast.loading("Fetching data...");
 
-      Promise.all([
-        fetch(`${API}/trips?${query}`, { signal: controller.signal }).then(
-          async (res) => {
-            if (!res.ok) throw new Error("Failed to fetch trips");
-            return res.json();
-          }
-        ),
-        fetch(`${API}/stats?${query}`, { signal: controller.signal }).then(
-          async (res) => {
-            if (!res.ok) throw new Error("Failed to fetch stats");
-            return res.json();
-          }
-        ),
-      ])
-        .then(([tripsData, statsData]) => {
-          setTrips(tripsData.trips);
-          setStats(statsData);
+      // One round trip returns both the trips page and the stats for these filters
+      fetch(`${API}/dashboard?${query}`, { signal: controller.signal })
+        .then(async (res) => {
+          if (!res.ok) throw new Error("Failed to fetch dashboard data");
+          return res.json();
+        })
+        .then((data) => {
+          setTrips(data.trips);
+          setTotalPages(data.total_pages);
+          setStats(data.stats);
           toast.success("Dashboard updated successfully", { id: toastId });
         })
         .catch((err) => {
@@ -545,8 +594,7 @@ export function Dashboard() {
                             onSelect={setDate}
                             numberOfMonths={1}
                             disabled={(date) =>
-                              date > new Date("2019-12-31") ||
-                              date < new Date("2008-01-01")
+                              date > bounds.dateMax || date < bounds.dateMin
                             }
                           />
                         </PopoverContent>
@@ -566,8 +614,8 @@ export function Dashboard() {
                           id="passengers"
                           value={passengerCount}
                           onValueChange={setPassengerCount}
-                          min={0}
-                          max={9}
+                          min={bounds.passengers[0]}
+                          max={bounds.passengers[1]}
                           step={1}
                         />
                       </div>
@@ -586,8 +634,8 @@ export function Dashboard() {
                           id="tdistance"
                           value={tdistance}
                           onValueChange={setTdistance}
-                          min={0}
-                          max={100}
+                          min={bounds.distance[0]}
+                          max={bounds.distance[1]}
                           step={1}
                         />
                       </div>
@@ -604,8 +652,8 @@ export function Dashboard() {
                           id="fare"
                           value={fare}
                           onValueChange={setFare}
-                          min={0}
-                          max={500}
+                          min={bounds.fare[0]}
+                          max={bounds.fare[1]}
                           step={5}
                         />
                       </div>
@@ -733,7 +781,10 @@ export function Dashboard() {
               >
                 Previous
               </Button>
-              <div className="text-sm font-medium">Page {page}</div>
+              <div className="text-sm font-medium">
+                Page {page}
+                {totalPages !== null && ` of ${totalPages}`}
+              </div>
               <Button
                 variant="outline"
                 size="sm"
@@ -742,7 +793,10 @@ export function Dashboard() {
                   setPage(newPage);
                   fetchData(buildParams(newPage));
                 }}
-                disabled={trips.length < 15}
+                disabled={
+                  trips.length < 15 ||
+                  (totalPages !== null && page >= totalPages)
+                }
               >
                 Next
               </Button>